@@ -1,13 +1,21 @@
 import logging
-from flask import Flask, render_template, jsonify, request, Response
-import threading
+from flask import Flask, render_template, jsonify, request, Response, send_file
 import time
-import csv
-import io
+import atexit
+import json
+import base64
 import os
+import zlib
+import functools
+import multiprocessing
 from config import Config
 from database import Database
-from processor import DataProcessor
+from processor import DataProcessor, ProcessingCancelled, market_category_groups
+from exports import ExportBuilder, generate_csv
+from scheduler import ProcessingScheduler
+from jobs import JobManager
+from metrics import Histogram, gauge, counter, render_last_run
+from profiling import RunProfiler
 
 # Configure logging to reduce verbosity
 logging.getLogger('werkzeug').setLevel(logging.WARNING)
@@ -21,16 +29,56 @@ processing_status = {
 	'total_markets': 0,
 	'processed_markets': 0,
 	'message': 'Ready for processing...',
+	'stage': 'idle',
 	'error': None,
+	'rows_decoded': 0,
+	'skipped_rows': 0,
+	'skipped_by_market': {},
+	'job_id': None,
+	'profile': None,
 	'database_ready': False  # Track if database has been processed
 }
 
 # Global database instance
 db = None
+# Background builder of the pre-rendered CSV exports
+export_builder = None
+# Ingestion runs; the lock file keeps a second server or CLI run off the same database
+job_manager = JobManager('./products.sqlite.ingest-lock')
+
+def close_database():
+	"""Close the pooled database connections on interpreter shutdown"""
+	if db:
+		db.close()
+
+atexit.register(close_database)
+
+# Latency of the read endpoints, served on /metrics
+request_latency = Histogram('kzp_request_duration_seconds', 'Latency of API requests', 'endpoint')
+
+def timed(endpoint: str):
+	"""Observe the latency of a view in request_latency"""
+	def decorator(view):
+		@functools.wraps(view)
+		def wrapper(*args, **kwargs):
+			started = time.perf_counter()
+			try:
+				return view(*args, **kwargs)
+			finally:
+				request_latency.observe(endpoint, time.perf_counter() - started)
+		return wrapper
+	return decorator
+
+# Upper bound on progress events pushed per second to each /api/processing-events client
+PROCESSING_EVENTS_PER_SECOND = 5
 
 # Track if we're in the main process (not reloader)
 is_main_process = os.environ.get('WERKZEUG_RUN_MAIN') != 'true'
 
+# Parallel ingestion workers (and the queue manager) re-import this module on spawn-based
+# platforms (Windows) as __mp_main__, where parent_process() may still be None
+is_worker_process = __name__ == '__mp_main__' or multiprocessing.parent_process() is not None
+
 # Category mapping (from the HTML select options)
 CATEGORIES = {
 	'1': '1. Бял хляб от 500 гр. до 1 кг',
@@ -112,25 +160,35 @@ def check_database_ready():
 	global db
 	try:
 		if db:
-			# Check if we have any products in the database
-			products = db.get_all_products()
-			return len(products) > 0
+			# Answered from ingest_metadata, so this stays cheap at startup
+			return db.has_products()
 	except Exception as e:
 		logging.error(f"Error checking database readiness: {e}")
 	return False
 
+def configured_market_groups(config) -> dict:
+	"""Market groups for category propagation, or {} when it is not enabled"""
+	propagation = config.get_category_propagation_config()
+	if not propagation.get('enabled', False):
+		return {}
+	return market_category_groups(config.get_markets(), share_source=propagation.get('share_source', True))
+
 def initialize_database_tables():
 	"""Initialize database tables without processing data"""
-	global db
+	global db, export_builder
 	try:
 		config = Config('./config.yaml')
-		db = Database('./products.sqlite')
+		db = Database('./products.sqlite', sqlite_config=config.get_sqlite_config(), cache_config=config.get_cache_config())
+		export_builder = ExportBuilder(db, config.get_export_config())
 		# Create tables if they don't exist
 		db.create_tables()
+		db.save_market_groups(configured_market_groups(config))
 		# Save category mapping to database
 		db.save_category_mapping(CATEGORIES)
 		# Update database ready status
 		processing_status['database_ready'] = check_database_ready()
+		if processing_status['database_ready']:
+			export_builder.schedule(delay=0)
 		logging.info("Database tables initialized successfully")
 		return True
 	except Exception as e:
@@ -143,9 +201,14 @@ def initialize_database_tables():
 		logging.error(f"Error initializing database tables: {e}")
 		return False
 
-def initialize_app():
-	"""Initialize the application with database setup and data processing"""
-	global processing_status, db
+def initialize_app(job=None, profile: bool = False):
+	"""
+	Initialize the application with database setup and data processing. With a job (see
+	begin_processing) the run can be cancelled and its stages are recorded in the job history;
+	errors are then re-raised so the job ends up failed or cancelled. profile (or
+	processing.profile in config.yaml) runs the processor under RunProfiler.
+	"""
+	global db
 	
 	# Skip if we're in the reloader process
 	if not is_main_process:
@@ -159,63 +222,154 @@ def initialize_app():
 	
 	try:
 		config = Config('./config.yaml')
-		db = Database('./products.sqlite')
+		# Reuse the connection pool the request handlers already share
+		if db is None:
+			db = Database('./products.sqlite', sqlite_config=config.get_sqlite_config(), cache_config=config.get_cache_config())
 		
 		# Get markets and total count for progress tracking
 		markets = config.get_markets()
 		total_markets = len(markets)
 		processing_status['total_markets'] = total_markets
 		
-		# --- SAVE CURRENT CATEGORIES BEFORE DROPPING TABLES ---
-		processing_status['message'] = 'Saving current category assignments...'
-		current_categories = db.get_current_categories()
-		logging.info(f"Saved {len(current_categories)} category assignments.")
-		
-		# Drop and recreate tables for clean start (preserves product_categories)
+		# The live tables are never dropped: a full reload is built into shadow tables and
+		# swapped in by the processor, incremental mode only writes what changed. Category
+		# assignments live in product_categories and are left alone, so edits made while the
+		# reload runs are kept.
+		incremental = config.get_processing_config().get('incremental', False)
 		processing_status['message'] = 'Setting up database tables...'
-		db.drop_tables()
-		db.create_tables()
+		# The search index is maintained by triggers; repair_fts forces a full rebuild
+		db.create_tables(repair_fts=config.get_processing_config().get('repair_fts', False))
+		db.save_market_groups(configured_market_groups(config))
 		
 		# Save category mapping to database
 		db.save_category_mapping(CATEGORIES)
 		
-		# Process Paradox data, passing the saved categories
+		# Process Paradox data
 		# BACKUP IS NOW HANDLED INSIDE THE PROCESSOR ITSELF
 		processing_status['message'] = 'Starting data processing with backup...'
-		processor = DataProcessor(markets, db, processing_status, current_categories)
-		processor.paradox_to_sqlite()
+		workers = config.get_processing_config().get('workers', 1)
+		fingerprint = config.get_processing_config().get('fingerprint', 'stat')
+		processor = DataProcessor(markets, db, processing_status, workers=workers,
+			incremental=incremental, fingerprint=fingerprint, backup_config=config.get_backup_config(),
+			cancel_event=job.cancel_event if job else None, stage_callback=job.record if job else None)
+		if profile or config.get_processing_config().get('profile', False):
+			# Next to ./backup; the summary of the hottest functions is kept in the status
+			profiler = RunProfiler('./profiles', top_n=config.get_processing_config().get('profile_top_n', 25))
+			try:
+				profiler.run(processor.paradox_to_sqlite)
+			finally:
+				processing_status['profile'] = profiler.summary
+		else:
+			processor.paradox_to_sqlite()
 		
 		processing_status['is_processing'] = False
+		processing_status['stage'] = 'done'
 		processing_status['message'] = 'Data processing completed successfully!'
 		processing_status['database_ready'] = True
 		processing_status['error'] = None
+		if export_builder:
+			export_builder.schedule(delay=0)
 		
+	except ProcessingCancelled:
+		processing_status['is_processing'] = False
+		processing_status['stage'] = 'cancelled'
+		processing_status['message'] = 'Processing cancelled'
+		logging.info("Processing cancelled")
+		if job:
+			raise
 	except Exception as e:
 		processing_status['is_processing'] = False
+		processing_status['stage'] = 'error'
 		processing_status['error'] = str(e)
 		processing_status['message'] = f'Error during processing: {e}'
+		if job:
+			raise
+
+def begin_processing(message: str, reason: str = 'manual', profile: bool = False) -> tuple:
+	"""
+	Reset the status and start a run as a background job. Returns (job, None), or (None, error)
+	if a run is already going on in this or another process.
+	"""
+	def reset_status(job):
+		# Updated in place: the running DataProcessor and open event streams hold this dict
+		processing_status.clear()
+		processing_status.update({
+			'is_processing': True,
+			'current_market': '',
+			'progress': 0,
+			'total_markets': 0,
+			'processed_markets': 0,
+			'message': message,
+			'stage': 'starting',
+			'error': None,
+			'rows_decoded': 0,
+			'skipped_rows': 0,
+			'skipped_by_market': {},
+			'job_id': job.id,
+			'profile': None,
+			# Existing data stays searchable while the reload runs
+			'database_ready': check_database_ready()
+		})
+	return job_manager.submit(reason, lambda job: initialize_app(job, profile=profile), prepare=reset_status)
+
+def sources_changed() -> bool:
+	"""Whether any configured Paradox file changed since it was last loaded"""
+	config = Config('./config.yaml')
+	fingerprint = config.get_processing_config().get('fingerprint', 'stat')
+	checker = DataProcessor(config.get_markets(), db, {}, fingerprint=fingerprint)
+	return checker.has_changed_sources()
 
-def start_processing_thread():
-	"""Start processing in a background thread"""
-	processing_thread = threading.Thread(target=initialize_app)
-	processing_thread.daemon = True
-	processing_thread.start()
+def start_scheduler(config) -> ProcessingScheduler:
+	"""Start the daily schedule (mode: scheduled) and/or the Paradox file watcher (watch: true)"""
+	processing_config = config.get_processing_config()
+	scheduled_time = processing_config.get('scheduled_time', '03:00') if processing_config.get('mode') == 'scheduled' else None
+	watch = processing_config.get('watch', False)
+	if not scheduled_time and not watch:
+		return None
+	messages = {'scheduled': 'Starting scheduled processing...', 'watch': 'Paradox files changed - starting processing...'}
+	processing_scheduler = ProcessingScheduler(
+		config.get_markets(),
+		start_run=lambda reason: begin_processing(messages[reason], reason)[0] is not None,
+		sources_changed=sources_changed,
+		scheduled_time=scheduled_time,
+		watch=watch,
+		debounce_seconds=processing_config.get('watch_debounce_seconds', 30)
+	)
+	processing_scheduler.start()
+	return processing_scheduler
 
-# Check if we should run processing automatically on startup
-config = Config('./config.yaml')
-processing_config = config.get_processing_config()
-processing_mode = processing_config.get('mode', 'startup')
+# Scheduled and watch-triggered runs are started from the server process itself
+processing_scheduler = None
+startup_done = False
 
-# Initialize database tables in all modes
-if not initialize_database_tables():
-	logging.error("Failed to initialize database tables")
+def init_app():
+	"""
+	Startup side effects: create the tables, start processing in startup mode and start the
+	scheduler. Called once from __main__ or by wsgi.py before serving, never at import time,
+	so worker processes that re-import this module do not repeat them.
+	"""
+	global processing_scheduler, startup_done
+	if startup_done or is_worker_process:
+		return
+	startup_done = True
+	config = Config('./config.yaml')
+	processing_mode = config.get_processing_config().get('mode', 'startup')
+
+	# Initialize database tables in all modes
+	if not initialize_database_tables():
+		logging.error("Failed to initialize database tables")
+
+	# Start data processing only in startup mode and in main process
+	if processing_mode == 'startup' and is_main_process:
+		logging.info("Starting automatic data processing in startup mode")
+		job, error = begin_processing('Starting data processing...', 'startup')
+		if error:
+			logging.warning(f"Startup processing not started: {error}")
+	else:
+		logging.info(f"Processing mode: {processing_mode}, Main process: {is_main_process}")
 
-# Start data processing only in startup mode and in main process
-if processing_mode == 'startup' and is_main_process:
-	logging.info("Starting automatic data processing in startup mode")
-	start_processing_thread()
-else:
-	logging.info(f"Processing mode: {processing_mode}, Main process: {is_main_process}")
+	if is_main_process:
+		processing_scheduler = start_scheduler(config)
 
 @app.route('/')
 def index():
@@ -225,149 +379,318 @@ def index():
 def get_processing_status():
 	return jsonify(processing_status)
 
+@app.route('/api/processing-events')
+def processing_events():
+	"""
+	Server-Sent Events stream of processing progress. Emits a 'stage' event on every stage
+	change (backup, decode, insert, fts, done), throttled 'status' snapshots while processing
+	runs, and a final 'done' event after which the stream is closed.
+	"""
+	def generate():
+		last_stage = None
+		last_status = None
+		while True:
+			status = dict(processing_status)
+			if status.get('stage') != last_stage:
+				last_stage = status.get('stage')
+				yield f"event: stage\ndata: {json.dumps({'stage': last_stage})}\n\n"
+			if status != last_status:
+				last_status = status
+				yield f"event: status\ndata: {json.dumps(status)}\n\n"
+			if not status['is_processing']:
+				yield "event: done\ndata: {}\n\n"
+				return
+			time.sleep(1.0 / PROCESSING_EVENTS_PER_SECOND)
+	
+	response = Response(generate(), mimetype='text/event-stream')
+	response.headers['Cache-Control'] = 'no-cache'
+	response.headers['X-Accel-Buffering'] = 'no'
+	return response
+
 @app.route('/api/start-processing', methods=['POST'])
 def start_processing():
 	"""Manually start data processing"""
-	global processing_status
-	
 	# Skip if we're in the reloader process
 	if not is_main_process:
 		return jsonify({'success': False, 'error': 'Cannot start processing in reloader process. Please restart the application without debug mode.'})
 	
-	# Check if processing is already running
-	if processing_status['is_processing']:
-		return jsonify({'success': False, 'error': 'Processing is already running'})
-	
-	# Reset processing status
-	processing_status = {
-		'is_processing': True,
-		'current_market': '',
-		'progress': 0,
-		'total_markets': 0,
-		'processed_markets': 0,
-		'message': 'Starting manual processing...',
-		'error': None,
-		'database_ready': False
+	# Reset the status and start processing in a background thread, unless already running;
+	# ?profile=1 profiles this run regardless of processing.profile
+	profile = request.args.get('profile', '0') not in ('0', 'false', '')
+	job, error = begin_processing('Starting manual processing...', profile=profile)
+	if error:
+		return jsonify({'success': False, 'error': error})
+	return jsonify({'success': True, 'message': 'Processing started successfully', 'job_id': job.id})
+
+@app.route('/api/cancel-processing', methods=['POST'])
+def cancel_processing():
+	"""Cancel the running job (optionally only if it is job_id); the live data stays as it was"""
+	data = request.get_json(silent=True) or {}
+	if not job_manager.cancel(data.get('job_id')):
+		return jsonify({'success': False, 'error': 'No matching processing run'})
+	processing_status['message'] = 'Cancelling processing...'
+	return jsonify({'success': True, 'message': 'Cancellation requested'})
+
+@app.route('/api/jobs')
+def list_jobs():
+	return jsonify({'jobs': job_manager.list_jobs()})
+
+@app.route('/api/jobs/<job_id>')
+def get_job(job_id):
+	job = job_manager.get(job_id)
+	if job is None:
+		return jsonify({'error': 'Unknown job'}), 404
+	return jsonify(job.to_dict())
+
+def serialize_product(product) -> dict:
+	"""Convert a product row (with its joined category code and name) to the API's JSON shape"""
+	return {
+		'id': product['id'],
+		'settlement': product['settlement'],
+		'market_name': product['market_name'],
+		'item_name': product['item_name'],
+		'item_code': product['item_code'],
+		'item_kzp_category_code': product['item_kzp_category_code'],
+		'item_kzp_category_name': product['item_kzp_category_name'],
+		'item_retail_price': product['item_retail_price'],
+		'item_promotional_price': product['item_promotional_price']
 	}
-	
-	# Start processing in background thread
-	start_processing_thread()
-	return jsonify({'success': True, 'message': 'Processing started successfully'})
+
+# Largest page a client may request from the paginated product endpoints
+MAX_PAGE_SIZE = 1000
+
+def parse_page_args(cursor_length: int):
+	"""
+	Read limit/cursor/count query parameters; raises ValueError on malformed input, including
+	cursors that decode but are not a list of cursor_length scalars (see encode_cursor).
+	"""
+	limit = request.args.get('limit', type=int)
+	if limit is not None:
+		limit = max(1, min(limit, MAX_PAGE_SIZE))
+	cursor = request.args.get('cursor')
+	# binascii.Error, UnicodeDecodeError and JSONDecodeError are all ValueErrors
+	after = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode()) if cursor else None
+	if after is not None:
+		if not isinstance(after, list) or len(after) != cursor_length:
+			raise ValueError('Invalid cursor')
+		if not all(isinstance(value, (str, int, float)) and not isinstance(value, bool) for value in after):
+			raise ValueError('Invalid cursor')
+	with_count = request.args.get('count') in ('1', 'true')
+	return limit, after, with_count
+
+def encode_cursor(values: list) -> str:
+	"""Opaque keyset cursor for the next page"""
+	return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
 
 @app.route('/api/search')
+@timed('search')
 def search_products():
 	search_term = request.args.get('q', '')
 	if not db:
 		return jsonify({'error': 'Database not ready'})
-	products = db.search_products(search_term)
-	product_list = []
-	for product in products:
-		category_name = db.get_category_name(product['item_kzp_category_code']) if product['item_kzp_category_code'] else ""
-		product_list.append({
-			'id': product['id'],  # Use the id column
-			'settlement': product['settlement'],
-			'market_name': product['market_name'],
-			'item_name': product['item_name'],
-			'item_code': product['item_code'],
-			'item_kzp_category_code': product['item_kzp_category_code'],
-			'item_kzp_category_name': category_name,
-			'item_retail_price': product['item_retail_price'],
-			'item_promotional_price': product['item_promotional_price']
-		})
-	return jsonify({'products': product_list, 'search_term': search_term})
+	try:
+		# (search_rank, market_name, item_name, id)
+		limit, after, with_count = parse_page_args(4)
+	except ValueError:
+		return jsonify({'error': 'Invalid pagination parameters'}), 400
+	products = db.search_products(search_term, limit=limit, after=after)
+	product_list = [serialize_product(product) for product in products]
+	result = {'products': product_list, 'search_term': search_term, 'next_cursor': None}
+	if limit and len(products) == limit:
+		last = products[-1]
+		result['next_cursor'] = encode_cursor([last['search_rank'], last['market_name'], last['item_name'], last['id']])
+	if with_count:
+		result['total'] = db.count_search_results(search_term)
+	return jsonify(result)
 
 # Add this new endpoint for category-based filtering
 @app.route('/api/products-by-category')
+@timed('products_by_category')
 def get_products_by_category():
 	category_code = request.args.get('category_code', '')
 	if not db:
 		return jsonify({'error': 'Database not ready'})
-	if category_code:
-		# Get products for specific category
-		products = db.get_products_by_category(category_code)
-	else:
-		# If no category specified, get all categorized products
-		products = db.get_products_by_category()
-	product_list = []
-	for product in products:
-		category_name = db.get_category_name(product['item_kzp_category_code']) if product['item_kzp_category_code'] else ""
-		product_list.append({
-			'id': product['id'],
-			'settlement': product['settlement'],
-			'market_name': product['market_name'],
-			'item_name': product['item_name'],
-			'item_code': product['item_code'],
-			'item_kzp_category_code': product['item_kzp_category_code'],
-			'item_kzp_category_name': category_name,
-			'item_retail_price': product['item_retail_price'],
-			'item_promotional_price': product['item_promotional_price']
-		})
-	return jsonify({'products': product_list, 'category_code': category_code})
+	try:
+		# (market_name, item_name, id)
+		limit, after, with_count = parse_page_args(3)
+	except ValueError:
+		return jsonify({'error': 'Invalid pagination parameters'}), 400
+	# If no category specified, get all categorized products
+	products = db.get_products_by_category(category_code or None, limit=limit, after=after)
+	product_list = [serialize_product(product) for product in products]
+	result = {'products': product_list, 'category_code': category_code, 'next_cursor': None}
+	if limit and len(products) == limit:
+		last = products[-1]
+		result['next_cursor'] = encode_cursor([last['market_name'], last['item_name'], last['id']])
+	if with_count:
+		result['total'] = db.count_products_by_category(category_code or None)
+	return jsonify(result)
+
+@app.route('/api/stats')
+def stats():
+	if not db:
+		return jsonify({'error': 'Database not ready'}), 503
+	return jsonify(db.get_stats())
+
+@app.route('/api/cache-stats')
+def cache_stats():
+	if not db:
+		return jsonify({'error': 'Database not ready'}), 503
+	stats = db.result_cache.stats()
+	stats['generation'] = db.generation
+	return jsonify(stats)
+
+def parse_selection(data: dict) -> dict:
+	"""
+	Selection of an update/remove request: either product_ids, or a selection object with a
+	search term and/or category_code applied server-side, optionally minus exclude_ids.
+	Excluded products are left alone even when category propagation reaches them from a
+	selected product in another market.
+	Returns keyword arguments for Database.assign_category / unassign_category.
+	"""
+	selection = data.get('selection')
+	if selection:
+		search_term = (selection.get('search') or '').strip()
+		in_category = selection.get('category_code') or None
+		if not search_term and not in_category:
+			raise ValueError('Empty selection')
+		return {
+			'search_term': search_term or None,
+			'in_category': in_category,
+			'exclude_ids': [int(product_id) for product_id in data.get('exclude_ids') or []]
+		}
+	product_ids = [int(product_id) for product_id in data.get('product_ids') or []]
+	if not product_ids:
+		raise ValueError('No products selected')
+	return {'product_ids': product_ids}
+
+def categories_changed():
+	"""Invalidate cached results and rebuild the pre-rendered exports once edits settle"""
+	db.bump_generation()
+	if export_builder:
+		export_builder.schedule()
 
 @app.route('/api/update-category', methods=['POST'])
 def update_category():
 	if not db:
 		return jsonify({'success': False, 'error': 'Database not ready'})
 	data = request.json
-	product_ids = data.get('product_ids', [])
 	category_code = data.get('category_code', '')
-	if not product_ids:
+	try:
+		selection = parse_selection(data)
+	except (ValueError, TypeError):
 		return jsonify({'success': False, 'error': 'No products selected'})
 	if not category_code:
 		return jsonify({'success': False, 'error': 'No category selected'})
-	success = db.update_product_category(product_ids, category_code)
+	updated_count = db.assign_category(category_code, **selection)
+	success = updated_count > 0
+	if success:
+		categories_changed()
 	category_name = CATEGORIES.get(category_code, '')
-	return jsonify({
+	result = {
 		'success': success,
 		'category_name': category_name,
 		'category_code': category_code,
-		'updated_count': len(product_ids)
-	})
+		'updated_count': max(updated_count, 0)
+	}
+	if not success:
+		result['error'] = 'No matching products'
+	return jsonify(result)
 
 @app.route('/api/remove-category', methods=['POST'])
 def remove_category():
 	if not db:
 		return jsonify({'success': False, 'error': 'Database not ready'})
 	data = request.json
-	product_ids = data.get('product_ids', [])
-	if not product_ids:
+	try:
+		selection = parse_selection(data)
+	except (ValueError, TypeError):
 		return jsonify({'success': False, 'error': 'No products selected'})
-	success = db.remove_product_category(product_ids)
+	updated_count = db.unassign_category(**selection)
+	success = updated_count >= 0
+	if updated_count > 0:
+		categories_changed()
 	return jsonify({
 		'success': success,
-		'updated_count': len(product_ids)
+		'updated_count': max(updated_count, 0)
 	})
 
+def gzip_chunks(chunks):
+	"""Gzip a byte stream on the fly; every chunk is flushed so the client receives it right away"""
+	compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+	for chunk in chunks:
+		data = compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+		if data:
+			yield data
+	yield compressor.flush()
+
 @app.route('/api/export-csv')
 def export_csv():
+	"""
+	Stream the categorized products as CSV. Optional filters: category (repeatable or
+	comma-separated codes), settlement and market. Exports of everything, one settlement
+	or one market are sent from the pre-rendered files when they are current (with an ETag
+	for If-None-Match); otherwise the response is streamed from the database, gzip-encoded
+	when the client accepts it unless gzip=0 is passed.
+	"""
 	if not db:
 		return Response("Database not ready", status=500)
-	products = db.get_products_by_category()
-	output = io.StringIO()
-	writer = csv.writer(output, quoting=csv.QUOTE_ALL)
-	writer.writerow([
-		'Населено място',
-		'Търговски обект',
-		'Наименование на продукта',
-		'Код на продукта',
-		'Категория',
-		'Цена на дребно',
-		'Цена в промоция'
-	])
-	for product in products:
-		writer.writerow([
-			product['settlement'],
-			product['market_name'],
-			product['item_name'],
-			product['item_code'],
-			product['item_kzp_category_code'] or "",
-			str(product['item_retail_price']) if product['item_retail_price'] is not None else "",
-			str(product['item_promotional_price']) if product['item_promotional_price'] is not None else ""
-		])
-	output.seek(0)
-	response = Response(output.getvalue(), mimetype='text/csv')
-	response.headers['Content-Disposition'] = 'attachment; filename=categorized_products.csv'
-	return response
+	started = time.perf_counter()
+	category_codes = [code for value in request.args.getlist('category') for code in value.split(',') if code]
+	settlement = request.args.get('settlement') or None
+	market_name = request.args.get('market') or None
+
+	if export_builder and not category_codes and not (settlement and market_name):
+		prerendered = export_builder.lookup(settlement=settlement, market_name=market_name)
+		if prerendered:
+			path, etag = prerendered
+			response = send_file(path, mimetype='text/csv', as_attachment=True,
+				download_name='categorized_products.csv', etag=etag, conditional=True, max_age=0)
+			response.headers['Vary'] = 'Accept-Encoding'
+			request_latency.observe('export_csv_file', time.perf_counter() - started)
+			return response
+
+	products = db.iter_categorized_products(
+		category_codes=category_codes,
+		settlement=settlement,
+		market_name=market_name
+	)
+	# Timed until the last chunk is sent, since the query runs while streaming
+	chunks = request_latency.time_stream('export_csv', generate_csv(products), started)
+	headers = {
+		'Content-Disposition': 'attachment; filename=categorized_products.csv',
+		'Vary': 'Accept-Encoding'
+	}
+	if request.args.get('gzip') != '0' and 'gzip' in request.accept_encodings:
+		chunks = gzip_chunks(chunks)
+		headers['Content-Encoding'] = 'gzip'
+	return Response(chunks, mimetype='text/csv', headers=headers)
+
+def last_run_metrics() -> dict:
+	if not db:
+		return {}
+	# Kept in ingest_metadata, so the last run survives a restart
+	return db.get_ingest_metadata().get('last_run_metrics') or {}
+
+@app.route('/api/metrics/last-run')
+def last_run():
+	"""Stage timings, throughput and skipped rows of the last successful ingestion run"""
+	return jsonify(last_run_metrics())
+
+@app.route('/metrics')
+def prometheus_metrics():
+	"""Prometheus text exposition of request latencies, the last ingestion run and the result cache"""
+	lines = request_latency.render()
+	lines += render_last_run(last_run_metrics())
+	lines += gauge('kzp_ingest_running', 'Whether an ingestion run is in progress', [(None, int(job_manager.is_running()))])
+	if db:
+		cache = db.result_cache.stats()
+		lines += counter('kzp_result_cache_lookups_total', 'Result cache lookups since start',
+			[({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])])
+		lines += gauge('kzp_result_cache_bytes', 'Estimated size of the cached results', [(None, cache['bytes'])])
+		lines += gauge('kzp_data_generation', 'Data generation the caches and exports refer to', [(None, db.generation)])
+	return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
 
 if __name__ == '__main__':
+	init_app()
 	app.run(debug=False, host='0.0.0.0', port=5000)
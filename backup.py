@@ -0,0 +1,203 @@
+import sqlite3
+import logging
+import hashlib
+import gzip
+import json
+import os
+import shutil
+from datetime import datetime
+
+try:
+	import zstandard
+except ImportError:
+	zstandard = None
+
+BACKUP_NAME_PREFIX = 'products_'
+MANIFEST_FILE = 'manifest.json'
+
+class BackupManager:
+	"""
+	Takes consistent database backups with the SQLite online backup API, optionally
+	compressed, deduplicated against the previous backup and pruned by a retention policy.
+	"""
+	def __init__(self, db_path: str, backup_dir: str = './backup', backup_config: dict = None, progress_callback=None):
+		backup_config = backup_config or {}
+		self.db_path = db_path
+		self.backup_dir = backup_dir
+		self.compression = backup_config.get('compression', 'none') or 'none'
+		self.pages_per_step = int(backup_config.get('pages_per_step', 1024))
+		# Retention: None/0 for every rule means backups are never pruned
+		self.keep_last = int(backup_config.get('keep_last') or 0)
+		self.keep_daily = int(backup_config.get('keep_daily') or 0)
+		self.keep_weekly = int(backup_config.get('keep_weekly') or 0)
+		self.progress_callback = progress_callback
+
+		if self.compression == 'zstd' and zstandard is None:
+			logging.warning("zstd backup compression requested but the zstandard package is not installed - using gzip")
+			self.compression = 'gzip'
+		if self.compression not in ('none', 'gzip', 'zstd'):
+			logging.warning(f"Unknown backup compression '{self.compression}' - backups will not be compressed")
+			self.compression = 'none'
+
+	def _report(self, progress: int, message: str):
+		if self.progress_callback:
+			self.progress_callback(progress, message)
+
+	def _extension(self) -> str:
+		return {'none': '.sqlite', 'gzip': '.sqlite.gz', 'zstd': '.sqlite.zst'}[self.compression]
+
+	def _next_backup_name(self) -> str:
+		"""Backup filename with date and an ID incrementing within the same second"""
+		today = datetime.now().strftime('%Y%m%d_%H%M%S')
+		backup_pattern = f"{BACKUP_NAME_PREFIX}{today}_"
+		existing_backups = []
+		for filename in os.listdir(self.backup_dir):
+			if filename.startswith(backup_pattern) and '.sqlite' in filename:
+				try:
+					# Extract the ID from filename: products_YYYYMMDD_HHMMSS_ID.sqlite[.gz|.zst]
+					existing_backups.append(int(filename[len(backup_pattern):].split('.')[0]))
+				except ValueError:
+					continue
+		next_id = max(existing_backups) + 1 if existing_backups else 1
+		return f"{backup_pattern}{next_id}{self._extension()}"
+
+	def _load_manifest(self) -> list:
+		manifest_path = os.path.join(self.backup_dir, MANIFEST_FILE)
+		try:
+			with open(manifest_path, 'r', encoding='utf-8') as f:
+				return json.load(f)
+		except (FileNotFoundError, ValueError):
+			return []
+
+	def _save_manifest(self, manifest: list):
+		manifest_path = os.path.join(self.backup_dir, MANIFEST_FILE)
+		with open(manifest_path + '.tmp', 'w', encoding='utf-8') as f:
+			json.dump(manifest, f, indent=1)
+		os.replace(manifest_path + '.tmp', manifest_path)
+
+	def _snapshot(self, snapshot_path: str):
+		"""Copy the live database page by page; safe while other connections are writing"""
+		def on_progress(status, remaining, total):
+			if total:
+				percent = int((total - remaining) * 100 / total)
+				self._report(percent, f"Backing up database: {total - remaining}/{total} pages")
+
+		source = sqlite3.connect(self.db_path)
+		target = sqlite3.connect(snapshot_path)
+		try:
+			source.backup(target, pages=self.pages_per_step, progress=on_progress)
+		finally:
+			target.close()
+			source.close()
+
+	@staticmethod
+	def _file_digest(path: str) -> str:
+		digest = hashlib.sha256()
+		with open(path, 'rb') as f:
+			for block in iter(lambda: f.read(1024 * 1024), b''):
+				digest.update(block)
+		return digest.hexdigest()
+
+	def _compress(self, snapshot_path: str, backup_path: str):
+		if self.compression == 'gzip':
+			with open(snapshot_path, 'rb') as src, gzip.open(backup_path, 'wb', compresslevel=6) as dst:
+				shutil.copyfileobj(src, dst, 1024 * 1024)
+		elif self.compression == 'zstd':
+			with open(snapshot_path, 'rb') as src, open(backup_path, 'wb') as dst:
+				zstandard.ZstdCompressor(level=3).copy_stream(src, dst)
+		else:
+			os.replace(snapshot_path, backup_path)
+			return
+		os.remove(snapshot_path)
+
+	def create_backup(self):
+		"""
+		Create a backup of the database. Returns the path of the backup, which is the
+		previous backup when the database has not changed since it was taken, or None on failure.
+		"""
+		if not os.path.exists(self.backup_dir):
+			os.makedirs(self.backup_dir)
+			logging.info(f"Created backup directory: {self.backup_dir}")
+
+		if not os.path.exists(self.db_path):
+			logging.error(f"Cannot create backup: Source database not found: {self.db_path}")
+			return None
+
+		backup_filename = self._next_backup_name()
+		backup_path = os.path.join(self.backup_dir, backup_filename)
+		snapshot_path = backup_path.split('.sqlite')[0] + '.sqlite.tmp'
+		try:
+			self._report(0, f"Creating backup: {backup_filename}")
+			self._snapshot(snapshot_path)
+			digest = self._file_digest(snapshot_path)
+
+			manifest = self._load_manifest()
+			if manifest and manifest[-1]['sha256'] == digest:
+				previous_path = os.path.join(self.backup_dir, manifest[-1]['file'])
+				if os.path.exists(previous_path):
+					os.remove(snapshot_path)
+					logging.info(f"Database unchanged since last backup, reusing: {previous_path}")
+					self._report(100, f"Database unchanged since last backup: {manifest[-1]['file']}")
+					return previous_path
+
+			if self.compression != 'none':
+				self._report(100, f"Compressing backup ({self.compression}): {backup_filename}")
+			self._compress(snapshot_path, backup_path)
+			manifest.append({
+				'file': backup_filename,
+				'sha256': digest,
+				'created': datetime.now().isoformat(timespec='seconds')
+			})
+			manifest = self._apply_retention(manifest)
+			self._save_manifest(manifest)
+			logging.info(f"Database backup created successfully: {backup_path}")
+			return backup_path
+		except Exception as e:
+			logging.error(f"Failed to create database backup: {e}")
+			if os.path.exists(snapshot_path):
+				os.remove(snapshot_path)
+			return None
+
+	@staticmethod
+	def _backup_time(filename: str):
+		"""Parse the timestamp out of products_YYYYMMDD_HHMMSS_ID.sqlite[...], or None"""
+		try:
+			stamp = filename[len(BACKUP_NAME_PREFIX):len(BACKUP_NAME_PREFIX) + 15]
+			return datetime.strptime(stamp, '%Y%m%d_%H%M%S')
+		except ValueError:
+			return None
+
+	def _apply_retention(self, manifest: list) -> list:
+		"""Delete backups not kept by any of the keep_last / keep_daily / keep_weekly rules"""
+		if not (self.keep_last or self.keep_daily or self.keep_weekly):
+			return manifest
+
+		backups = []
+		for filename in os.listdir(self.backup_dir):
+			if filename.startswith(BACKUP_NAME_PREFIX) and '.sqlite' in filename and not filename.endswith('.tmp'):
+				created = self._backup_time(filename)
+				if created:
+					backups.append((created, filename))
+		# Newest first
+		backups.sort(reverse=True)
+
+		keep = set(filename for _, filename in backups[:self.keep_last])
+		for rule_count, period in ((self.keep_daily, lambda t: t.date()), (self.keep_weekly, lambda t: t.isocalendar()[:2])):
+			seen_periods = []
+			for created, filename in backups:
+				key = period(created)
+				if key in seen_periods:
+					continue
+				if len(seen_periods) >= rule_count:
+					break
+				seen_periods.append(key)
+				keep.add(filename)
+
+		for _, filename in backups:
+			if filename not in keep:
+				try:
+					os.remove(os.path.join(self.backup_dir, filename))
+					logging.info(f"Pruned old backup: {filename}")
+				except OSError as e:
+					logging.warning(f"Could not prune backup {filename}: {e}")
+		return [entry for entry in manifest if entry['file'] in keep]
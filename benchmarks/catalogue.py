@@ -0,0 +1,109 @@
+"""
+Synthetic Bulgarian shop catalogues for the benchmarks.
+
+catalogue_rows() returns products in the layout of the products table, for loading
+SQLite directly. write_source() writes a small spec file in place of a Paradox .DB file;
+SyntheticTable, passed to DataProcessor as its reader, turns it back into Paradox-like rows
+so the whole ingestion path runs without real Paradox files.
+"""
+import json
+import random
+
+PRODUCTS = [
+	('Хляб', ['бял', 'Добруджа', 'ръжен', 'типов', 'пълнозърнест'], ['500гр', '650гр', '1кг']),
+	('Прясно мляко', ['2%', '3%', '3.6%'], ['1л', '2л']),
+	('Кисело мляко', ['2%', '3.6%', 'био'], ['370гр', '400гр', '500гр']),
+	('Сирене краве', ['насипно', 'пакетирано', 'зряло'], ['400гр', '1кг']),
+	('Кашкавал', ['краве', 'овче', 'Витоша'], ['300гр', '400гр', '1кг']),
+	('Масло краве', ['82%', 'несолено'], ['125гр', '250гр']),
+	('Извара', ['насипна', 'пакетирана'], ['200гр', '500гр', '1кг']),
+	('Пилешко филе', ['охладено', 'замразено'], ['500гр', '1кг']),
+	('Свинско месо', ['плешка', 'бут', 'врат', 'шол'], ['1кг']),
+	('Кренвирши', ['пилешки', 'свински', 'насипни'], ['400гр', '1кг']),
+	('Луканка', ['Панагюрска', 'Смядовска'], ['250гр', '1кг']),
+	('Яйца', ['размер М', 'размер L'], ['6бр', '10бр']),
+	('Боб', ['зрял', 'смилянски'], ['500гр', '1кг']),
+	('Ориз', ['бисерен', 'дългозърнест'], ['500гр', '1кг']),
+	('Спагети', ['№3', '№5', '№10'], ['500гр']),
+	('Олио слънчогледово', ['рафинирано'], ['1л', '2л']),
+	('Лютеница', ['домашна', 'лютива'], ['260гр', '500гр']),
+	('Бисквити', ['обикновени', 'какаови', 'с овес'], ['150гр', '300гр']),
+	('Шоколад', ['млечен', 'черен', 'с лешници'], ['80гр', '100гр']),
+	('Кафе', ['мляно', 'на зърна', 'разтворимо'], ['200гр', '250гр', '1кг']),
+	('Бира светла', ['бутилка', 'кен'], ['500мл', '2л']),
+	('Вино', ['бяло', 'червено', 'розе'], ['750мл']),
+	('Препарат за съдове', ['лимон', 'ябълка'], ['400мл', '900мл']),
+	('Тоалетна хартия', ['двупластова', 'трипластова'], ['8 ролки', '16 ролки']),
+	('Мокри кърпи', ['класически', 'бебешки'], ['пакет 72бр'])
+]
+BRANDS = [
+	'Верея', 'Олимпус', 'Елена', 'Тандем', 'Бор Чвор', 'Маджаров', 'Деляна', 'Булгарикум',
+	'Престиж', 'Родна стряха', 'Добруджанско', 'Зелена долина', 'Каменица', 'Загорка'
+]
+
+def item_name(rng: random.Random) -> str:
+	product, variants, units = rng.choice(PRODUCTS)
+	name = f"{product} {rng.choice(variants)} {rng.choice(BRANDS)} {rng.choice(units)}"
+	# Paradox catalogues mix upper-case and regular item names
+	return name.upper() if rng.random() < 0.3 else name
+
+def catalogue_rows(markets: int, rows: int, settlement: str = '07079', seed: int = 42) -> list:
+	"""markets x rows products as (settlement, market_name, item_name, item_code, price, promotional_price)"""
+	data = []
+	for market_index in range(markets):
+		rng = random.Random(seed + market_index)
+		market_name = f"Обект {market_index} гр. Бургас"
+		for row_index in range(rows):
+			data.append((settlement, market_name, item_name(rng), str(100000 + row_index), round(rng.uniform(0.5, 50), 2), None))
+	return data
+
+def write_source(path: str, rows: int, skip_ratio: float = 0.1, seed: int = 42):
+	"""Write the spec SyntheticTable reads in place of a Paradox file"""
+	with open(path, 'w', encoding='utf-8') as f:
+		json.dump({'rows': rows, 'skip_ratio': skip_ratio, 'seed': seed}, f)
+
+class SyntheticRow:
+	__slots__ = ('Act', 'Item', 'id', 'ClientPrice')
+
+	def __init__(self, act, item, item_id, client_price):
+		self.Act = act
+		self.Item = item
+		self.id = item_id
+		self.ClientPrice = client_price
+
+class SyntheticTable:
+	"""
+	Stand-in for pypxlib.Table over a write_source() spec. Rows are generated on the fly
+	and the same spec always yields the same rows. A skip_ratio share of them is inactive
+	(Act != '*'); every tenth of those has no price instead, so several skip reasons show up.
+	"""
+	def __init__(self, path: str, encoding: str = None):
+		with open(path, 'r', encoding='utf-8') as f:
+			spec = json.load(f)
+		self.rows = spec['rows']
+		self.skip_ratio = spec['skip_ratio']
+		self.seed = spec['seed']
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc_info):
+		self.close()
+
+	def close(self):
+		pass
+
+	def __len__(self):
+		return self.rows
+
+	def __iter__(self):
+		rng = random.Random(self.seed)
+		for row_index in range(self.rows):
+			name = item_name(rng)
+			price = round(rng.uniform(0.5, 50), 2)
+			if rng.random() >= self.skip_ratio:
+				yield SyntheticRow('*', name, 100000 + row_index, price)
+			elif row_index % 10 == 0:
+				yield SyntheticRow('*', name, 100000 + row_index, None)
+			else:
+				yield SyntheticRow(' ', name, 100000 + row_index, price)
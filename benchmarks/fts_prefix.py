@@ -0,0 +1,69 @@
+"""
+Prefix-search latency of products_fts with and without prefix indexes.
+
+Builds two throwaway databases with the same synthetic Bulgarian catalogue, one with
+the FTS5 defaults and one with the configured prefix indexes, and times search_products
+(first page of 200, ranked and joined like /api/search) and count_search_results for
+prefixes of 1 to 4 letters. The uncached implementations are called, so every run
+reaches SQLite.
+
+	python benchmarks/fts_prefix.py [--rows 200000] [--repeat 20]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from catalogue import catalogue_rows
+from database import Database, DEFAULT_FTS_PREFIX, DEFAULT_FTS_TOKENIZE
+
+QUERIES = ['к', 'ки', 'кис', 'кисе', 'м', 'мл', 'мля', 'мляк', 'с', 'си', 'сир', 'сире']
+
+def build_database(path: str, data: list, fts_prefix) -> Database:
+	db = Database(path, sqlite_config={'fts_prefix': fts_prefix, 'fts_tokenize': DEFAULT_FTS_TOKENIZE})
+	db.create_tables()
+	db.insert_products_batch(data)
+	return db
+
+def time_queries(db: Database, repeat: int) -> dict:
+	"""{query: (page_ms, count_ms)}, the mean of repeat runs each"""
+	timings = {}
+	for query in QUERIES:
+		# Warm the page cache so the first query does not pay for reading the index
+		db._count_search_results(query)
+		started = time.perf_counter()
+		for _ in range(repeat):
+			db._search_products(query, limit=200)
+		page_ms = (time.perf_counter() - started) * 1000 / repeat
+		started = time.perf_counter()
+		for _ in range(repeat):
+			db._count_search_results(query)
+		count_ms = (time.perf_counter() - started) * 1000 / repeat
+		timings[query] = (page_ms, count_ms)
+	return timings
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--rows', type=int, default=200000)
+	parser.add_argument('--repeat', type=int, default=20)
+	args = parser.parse_args()
+
+	data = catalogue_rows(markets=6, rows=args.rows // 6)
+	results = {}
+	with tempfile.TemporaryDirectory() as directory:
+		for label, prefix in (('no prefix index', []), (f"prefix={' '.join(map(str, DEFAULT_FTS_PREFIX))}", DEFAULT_FTS_PREFIX)):
+			db = build_database(os.path.join(directory, f"{len(results)}.sqlite"), data, prefix)
+			results[label] = time_queries(db, args.repeat)
+			db.close()
+
+	labels = list(results)
+	print(f"{args.rows} products, mean of {args.repeat} runs, milliseconds per query (page of 200 / count)")
+	print(f"{'query':<10}" + ''.join(f"{label:>30}" for label in labels))
+	for query in QUERIES:
+		print(f"{query + '*':<10}" + ''.join(f"{results[label][query][0]:>20.3f}{results[label][query][1]:>10.3f}" for label in labels))
+
+if __name__ == '__main__':
+	main()
@@ -0,0 +1,253 @@
+"""
+End-to-end benchmark of ingestion, FTS search, bulk category updates and CSV export.
+
+Generates a synthetic catalogue of N markets x M rows (see catalogue.py), ingests it
+through DataProcessor with the SyntheticTable reader, then times searches by query shape,
+category assignments and exports against the loaded database. Results are written as JSON
+named after the current commit, so two runs can be compared:
+
+	python benchmarks/suite.py [--markets 6] [--rows 20000] [--skip-ratio 0.1] [--workers 1]
+	python benchmarks/suite.py --compare suite-abc1234.json suite-def5678.json
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+REPO_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, REPO_DIR)
+
+from catalogue import SyntheticTable, write_source
+from database import Database
+from exports import ExportBuilder, generate_csv
+from processor import DataProcessor
+
+# Search terms by shape; each is run through search_products and count_search_results
+QUERY_SHAPES = {
+	'prefix_1': 'к',
+	'prefix_3': 'кис',
+	'word': 'мляко',
+	'two_words': 'кисело мляко',
+	'upper_case': 'ВЕРЕЯ',
+	'unit': '500гр',
+	'no_match': 'шфщ'
+}
+# Categories assigned before the export benchmarks, so the exports have rows to write
+EXPORT_CATEGORIES = {'1': 'хляб', '6': 'прясно мляко', '7': 'кисело мляко', '70': 'кафе'}
+
+def commit_id() -> str:
+	try:
+		commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+			capture_output=True, text=True, check=True).stdout.strip()
+		dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=REPO_DIR,
+			capture_output=True, text=True, check=True).stdout.strip()
+	except (OSError, subprocess.CalledProcessError):
+		return 'unknown'
+	return f"{commit}-dirty" if dirty else commit
+
+def summarize(timings: list, **extra) -> dict:
+	"""Milliseconds of repeated runs"""
+	result = {
+		'runs': len(timings),
+		'mean_ms': round(statistics.mean(timings) * 1000, 3),
+		'median_ms': round(statistics.median(timings) * 1000, 3),
+		'min_ms': round(min(timings) * 1000, 3)
+	}
+	result.update(extra)
+	return result
+
+def measure(run, repeat: int, **extra) -> dict:
+	timings = []
+	for _ in range(repeat):
+		started = time.perf_counter()
+		run()
+		timings.append(time.perf_counter() - started)
+	return summarize(timings, **extra)
+
+def make_markets(directory: str, markets: int, rows: int, skip_ratio: float, markets_per_file: int) -> list:
+	market_list = []
+	for market_index in range(markets):
+		path_to_db = os.path.join(directory, f"source{market_index // markets_per_file}.DB")
+		if not os.path.exists(path_to_db):
+			write_source(path_to_db, rows, skip_ratio, seed=market_index // markets_per_file)
+		market_list.append({
+			'settlement': '07079',
+			'name': f"Обект {market_index}",
+			'address': 'гр. Бургас',
+			'path_to_db': path_to_db
+		})
+	return market_list
+
+def ingest(db: Database, markets: list, workers: int, incremental: bool = False) -> dict:
+	processor = DataProcessor(markets, db, {}, workers=workers, incremental=incremental,
+		backup_config={'compression': 'none'}, reader=SyntheticTable)
+	started = time.perf_counter()
+	# The processor reports progress on stdout
+	with contextlib.redirect_stdout(io.StringIO()):
+		processor.paradox_to_sqlite()
+	elapsed = time.perf_counter() - started
+	run_metrics = processor.run_metrics or {}
+	return summarize([elapsed], stages=run_metrics.get('stages', {}), rows_decoded=run_metrics.get('rows_decoded', 0),
+		rows_inserted=run_metrics.get('rows_inserted', 0), skipped_by_reason=run_metrics.get('skipped_by_reason', {}))
+
+def bench_ingestion(db: Database, markets: list, workers: int) -> dict:
+	return {
+		'ingest.full_initial': ingest(db, markets, workers),
+		'ingest.full_reload': ingest(db, markets, workers),
+		'ingest.incremental_unchanged': ingest(db, markets, workers, incremental=True)
+	}
+
+def bench_search(db: Database, repeat: int) -> dict:
+	results = {}
+	for shape, term in QUERY_SHAPES.items():
+		rows = len(db.search_products(term, limit=200))
+		results[f"search.{shape}"] = measure(lambda: db.search_products(term, limit=200), repeat, rows=rows)
+		total = db.count_search_results(term)
+		results[f"search_count.{shape}"] = measure(lambda: db.count_search_results(term), repeat, rows=total)
+	return results
+
+def bench_categories(db: Database, repeat: int) -> dict:
+	with db.reader() as conn:
+		product_ids = [row[0] for row in conn.execute("SELECT id FROM products ORDER BY id LIMIT 1000")]
+	assign_search, unassign_search, assign_ids = [], [], []
+	updated = {}
+	for _ in range(repeat):
+		started = time.perf_counter()
+		updated['assign_search'] = db.assign_category('1', search_term='хляб')
+		assign_search.append(time.perf_counter() - started)
+		started = time.perf_counter()
+		updated['unassign_search'] = db.unassign_category(search_term='хляб')
+		unassign_search.append(time.perf_counter() - started)
+		started = time.perf_counter()
+		updated['assign_ids'] = db.assign_category('84', product_ids=product_ids)
+		assign_ids.append(time.perf_counter() - started)
+		db.unassign_category(product_ids=product_ids)
+	return {
+		'category.assign_search': summarize(assign_search, rows=updated['assign_search']),
+		'category.unassign_search': summarize(unassign_search, rows=updated['unassign_search']),
+		'category.assign_ids': summarize(assign_ids, rows=updated['assign_ids'])
+	}
+
+def bench_export(db: Database, directory: str, repeat: int) -> dict:
+	for category_code, term in EXPORT_CATEGORIES.items():
+		db.assign_category(category_code, search_term=term)
+	db.bump_generation()
+	export_dir = os.path.join(directory, 'exports')
+
+	def stream() -> int:
+		return sum(len(chunk) for chunk in generate_csv(db.iter_categorized_products()))
+
+	def prerender() -> int:
+		# A fresh builder and directory, or the previous build would be adopted
+		shutil.rmtree(export_dir, ignore_errors=True)
+		builder = ExportBuilder(db, {'directory': export_dir})
+		builder.build()
+		return len(builder._index)
+
+	return {
+		'export.stream_all': measure(stream, repeat, bytes=stream()),
+		'export.prerender': measure(prerender, repeat, files=prerender())
+	}
+
+def run_suite(args) -> dict:
+	results = {}
+	previous_dir = os.getcwd()
+	with tempfile.TemporaryDirectory() as directory:
+		# The processor writes its logs and ./backup relative to the working directory
+		os.chdir(directory)
+		try:
+			markets = make_markets(directory, args.markets, args.rows, args.skip_ratio, args.markets_per_file)
+			# No result cache, so repeated queries measure SQLite rather than the cache
+			db = Database(os.path.join(directory, 'products.sqlite'), cache_config={'max_entries': 0})
+			db.create_tables()
+			try:
+				for name, bench in (
+					('ingestion', lambda: bench_ingestion(db, markets, args.workers)),
+					('search', lambda: bench_search(db, args.repeat)),
+					('categories', lambda: bench_categories(db, args.repeat)),
+					('export', lambda: bench_export(db, directory, args.repeat))
+				):
+					print(f"Running {name} benchmarks...", file=sys.stderr)
+					results.update(bench())
+			finally:
+				db.close()
+		finally:
+			os.chdir(previous_dir)
+	return results
+
+def print_results(results: dict):
+	print(f"{'benchmark':<34}{'mean ms':>12}{'min ms':>12}  details")
+	for name, result in results.items():
+		details = ', '.join(f"{key}={value}" for key, value in result.items()
+			if key not in ('runs', 'mean_ms', 'median_ms', 'min_ms', 'stages', 'skipped_by_reason'))
+		print(f"{name:<34}{result['mean_ms']:>12.3f}{result['min_ms']:>12.3f}  {details}")
+
+def compare(base_path: str, new_path: str):
+	"""Print the change in mean time of every benchmark present in both result files"""
+	with open(base_path, 'r', encoding='utf-8') as f:
+		base = json.load(f)
+	with open(new_path, 'r', encoding='utf-8') as f:
+		new = json.load(f)
+	print(f"{base['commit']} -> {new['commit']}")
+	if base['parameters'] != new['parameters']:
+		print(f"Warning: parameters differ: {base['parameters']} vs {new['parameters']}")
+	print(f"{'benchmark':<34}{'base ms':>12}{'new ms':>12}{'change':>10}")
+	for name, result in new['results'].items():
+		if name not in base['results']:
+			continue
+		base_ms = base['results'][name]['mean_ms']
+		change = f"{(result['mean_ms'] - base_ms) / base_ms * 100:+.1f}%" if base_ms else 'n/a'
+		print(f"{name:<34}{base_ms:>12.3f}{result['mean_ms']:>12.3f}{change:>10}")
+
+def main():
+	parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+	parser.add_argument('--markets', type=int, default=6)
+	parser.add_argument('--rows', type=int, default=20000, help='Rows per Paradox file')
+	parser.add_argument('--skip-ratio', type=float, default=0.1, help='Share of rows the processor skips')
+	parser.add_argument('--markets-per-file', type=int, default=1, help='Markets reading the same Paradox file')
+	parser.add_argument('--workers', type=int, default=1, help='Ingestion worker processes')
+	parser.add_argument('--repeat', type=int, default=5)
+	parser.add_argument('--output', help='Result file (default: suite-<commit>.json)')
+	parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'), help='Compare two result files and exit')
+	args = parser.parse_args()
+
+	if args.compare:
+		compare(*args.compare)
+		return
+
+	commit = commit_id()
+	results = run_suite(args)
+	report = {
+		'commit': commit,
+		'created_at': datetime.now().isoformat(timespec='seconds'),
+		'python': platform.python_version(),
+		'sqlite': sqlite3.sqlite_version,
+		'platform': platform.platform(),
+		'parameters': {
+			'markets': args.markets,
+			'rows': args.rows,
+			'skip_ratio': args.skip_ratio,
+			'markets_per_file': args.markets_per_file,
+			'workers': args.workers,
+			'repeat': args.repeat
+		},
+		'results': results
+	}
+	output = args.output or f"suite-{commit}.json"
+	with open(output, 'w', encoding='utf-8') as f:
+		json.dump(report, f, ensure_ascii=False, indent=2)
+	print_results(results)
+	print(f"\nResults written to {output}")
+
+if __name__ == '__main__':
+	main()
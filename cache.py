@@ -0,0 +1,75 @@
+import sys
+import threading
+from collections import OrderedDict
+
+class ResultCache:
+	"""
+	Thread-safe LRU cache for query results, bounded by entry count and by an
+	estimate of the memory the cached rows take up.
+	"""
+	def __init__(self, max_entries: int = 256, max_bytes: int = 64 * 1024 * 1024):
+		self.max_entries = int(max_entries)
+		self.max_bytes = int(max_bytes)
+		self._entries = OrderedDict()
+		self._bytes = 0
+		self._lock = threading.Lock()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+
+	@property
+	def enabled(self) -> bool:
+		return self.max_entries > 0 and self.max_bytes > 0
+
+	@staticmethod
+	def estimate_size(value) -> int:
+		"""Rough size in bytes of a result: a list of rows, a row or a scalar"""
+		if isinstance(value, (list, tuple)) or hasattr(value, 'keys'):
+			return sys.getsizeof(value) + sum(ResultCache.estimate_size(item) for item in value)
+		return sys.getsizeof(value)
+
+	def get(self, key):
+		"""Return (True, value) on a hit, (False, None) on a miss"""
+		with self._lock:
+			if key in self._entries:
+				self._entries.move_to_end(key)
+				self.hits += 1
+				return True, self._entries[key][0]
+			self.misses += 1
+			return False, None
+
+	def put(self, key, value):
+		if not self.enabled:
+			return
+		size = self.estimate_size(value)
+		if size > self.max_bytes:
+			# A single oversized result would just flush everything else
+			return
+		with self._lock:
+			if key in self._entries:
+				self._bytes -= self._entries.pop(key)[1]
+			self._entries[key] = (value, size)
+			self._bytes += size
+			while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+				_, (_, evicted_size) = self._entries.popitem(last=False)
+				self._bytes -= evicted_size
+				self.evictions += 1
+
+	def clear(self):
+		with self._lock:
+			self._entries.clear()
+			self._bytes = 0
+
+	def stats(self) -> dict:
+		with self._lock:
+			lookups = self.hits + self.misses
+			return {
+				'entries': len(self._entries),
+				'bytes': self._bytes,
+				'max_entries': self.max_entries,
+				'max_bytes': self.max_bytes,
+				'hits': self.hits,
+				'misses': self.misses,
+				'evictions': self.evictions,
+				'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+			}
@@ -5,6 +5,11 @@ class Config:
         self.file_path = file_path
         self._markets = []
         self.processing_config = {}
+        self.backup_config = {}
+        self.sqlite_config = {}
+        self.cache_config = {}
+        self.export_config = {}
+        self.category_propagation_config = {}
         self._load_config()
     
     def _load_config(self):
@@ -16,6 +21,21 @@ class Config:
                 # Load processing configuration
                 self.processing_config = config.get('processing', {})
                 
+                # Load backup configuration
+                self.backup_config = config.get('backup', {}) or {}
+                
+                # Load SQLite performance profile
+                self.sqlite_config = config.get('sqlite', {}) or {}
+                
+                # Load search result cache limits
+                self.cache_config = config.get('cache', {}) or {}
+                
+                # Load pre-rendered CSV export settings
+                self.export_config = config.get('exports', {}) or {}
+                
+                # Load cross-market category propagation settings
+                self.category_propagation_config = config.get('category_propagation', {}) or {}
+                
                 # Load markets list
                 self._markets = config.get('markets', [])
                 
@@ -35,3 +55,23 @@ class Config:
     def get_processing_config(self):
         """Get processing configuration"""
         return self.processing_config
+    
+    def get_backup_config(self):
+        """Get backup configuration"""
+        return self.backup_config
+    
+    def get_sqlite_config(self):
+        """Get SQLite connection profile"""
+        return self.sqlite_config
+    
+    def get_cache_config(self):
+        """Get search result cache configuration"""
+        return self.cache_config
+    
+    def get_export_config(self):
+        """Get pre-rendered CSV export configuration"""
+        return self.export_config
+    
+    def get_category_propagation_config(self):
+        """Get cross-market category propagation configuration"""
+        return self.category_propagation_config
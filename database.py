@@ -1,59 +1,324 @@
 import sqlite3
 import logging
+import threading
+import queue
+import json
+from contextlib import contextmanager
+from cache import ResultCache
+
+# Products table and its FTS5 index are templated on their names so that a full reload
+# can be built into shadow tables and swapped in atomically.
+PRODUCTS_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS {table} (
+	id INTEGER PRIMARY KEY AUTOINCREMENT,
+	settlement TEXT NOT NULL,
+	market_name TEXT NOT NULL,
+	item_name TEXT NOT NULL,
+	item_code TEXT NOT NULL,
+	item_retail_price REAL,
+	item_promotional_price REAL{constraints}
+)
+"""
+PRODUCTS_UNIQUE_CONSTRAINT = """,
+	UNIQUE(market_name, item_code)"""
+
+# The content table stays 'products' for the shadow index too: it is resolved by name at
+# query time, so after the swap the renamed index reads from the renamed table.
+PRODUCTS_FTS_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5(
+	settlement,
+	market_name,
+	item_name,
+	item_code,
+	content='products',
+	content_rowid='id'{options}
+)
+"""
+
+# Keep the external-content index in step with products row by row, so that incremental
+# loads and single-row writes only re-tokenize what changed. The full reload bypasses them:
+# the shadow table has no triggers and its index is populated in one pass before the swap.
+PRODUCTS_FTS_TRIGGERS_SQL = [
+	"""
+	CREATE TRIGGER IF NOT EXISTS products_fts_insert AFTER INSERT ON products BEGIN
+		INSERT INTO products_fts(rowid, settlement, market_name, item_name, item_code)
+		VALUES (new.id, new.settlement, new.market_name, new.item_name, new.item_code);
+	END
+	""",
+	"""
+	CREATE TRIGGER IF NOT EXISTS products_fts_delete AFTER DELETE ON products BEGIN
+		INSERT INTO products_fts(products_fts, rowid, settlement, market_name, item_name, item_code)
+		VALUES ('delete', old.id, old.settlement, old.market_name, old.item_name, old.item_code);
+	END
+	""",
+	# Price-only updates leave the index alone
+	"""
+	CREATE TRIGGER IF NOT EXISTS products_fts_update AFTER UPDATE ON products
+	WHEN old.id IS NOT new.id OR old.settlement IS NOT new.settlement OR old.market_name IS NOT new.market_name
+		OR old.item_name IS NOT new.item_name OR old.item_code IS NOT new.item_code
+	BEGIN
+		INSERT INTO products_fts(products_fts, rowid, settlement, market_name, item_name, item_code)
+		VALUES ('delete', old.id, old.settlement, old.market_name, old.item_name, old.item_code);
+		INSERT INTO products_fts(rowid, settlement, market_name, item_name, item_code)
+		VALUES (new.id, new.settlement, new.market_name, new.item_name, new.item_code);
+	END
+	"""
+]
+
+# The selected products plus the same item_code in every other market of their group;
+# preceded by "WITH selected AS (...)". Without market groups it is just the selection.
+# Excluded products are subtracted from the result (see _selection_sql), so an exclusion
+# wins over propagation from a selected copy of the item in another market.
+PROPAGATED_SELECTION_SQL = """
+SELECT market_name, item_code FROM selected
+UNION
+SELECT g2.market_name, s.item_code
+FROM selected s
+JOIN market_groups g1 ON g1.market_name = s.market_name
+JOIN market_groups g2 ON g2.group_id = g1.group_id AND g2.market_name != g1.market_name
+JOIN products p ON p.market_name = g2.market_name AND p.item_code = s.item_code
+"""
+
+# Prefix indexes make short "word"* queries read one index range instead of expanding every
+# matching term. unicode61 case-folds Cyrillic; remove_diacritics 2 only folds Latin accents
+# (brand names), Bulgarian й and ѝ are kept distinct from и.
+DEFAULT_FTS_PREFIX = [2, 3, 4]
+DEFAULT_FTS_TOKENIZE = 'unicode61 remove_diacritics 2'
+
+SHADOW_PRODUCTS_TABLE = 'products_shadow'
+SHADOW_PRODUCTS_FTS = 'products_fts_shadow'
+
+# Connection pragmas applied when config.yaml has no sqlite: section
+DEFAULT_SQLITE_CONFIG = {
+	'journal_mode': 'WAL',
+	'synchronous': 'NORMAL',
+	'cache_size': -65536,
+	'mmap_size': 268435456,
+	'temp_store': 'MEMORY'
+}
+
+# Relaxed profile of the dedicated connection that fills the shadow tables of a full reload
+# (see bulk_load). The shared write connection, which category edits use, never takes it.
+DEFAULT_BULK_LOAD_CONFIG = {
+	'synchronous': 'OFF',
+	'cache_size': -262144
+}
 
 class Database:
-	def __init__(self, db_path: str):
+	def __init__(self, db_path: str, max_readers: int = 8, sqlite_config: dict = None, cache_config: dict = None):
+		sqlite_config = dict(sqlite_config or {})
 		self.db_path = db_path
-		self.connection = None
+		self.max_readers = int(sqlite_config.pop('max_readers', max_readers))
+		self.bulk_load_config = dict(DEFAULT_BULK_LOAD_CONFIG, **(sqlite_config.pop('bulk_load', None) or {}))
+		self.fts_options = self._fts_options(
+			sqlite_config.pop('fts_prefix', DEFAULT_FTS_PREFIX),
+			sqlite_config.pop('fts_tokenize', DEFAULT_FTS_TOKENIZE)
+		)
+		self.sqlite_config = dict(DEFAULT_SQLITE_CONFIG, **sqlite_config)
+		# Idle read-only connections, most recently used first so page caches stay warm
+		self._readers = queue.LifoQueue()
+		self._reader_count = 0
+		self._pool_lock = threading.Lock()
+		self._reader_slots = threading.BoundedSemaphore(self.max_readers)
+		# The single write connection is shared by all threads and serialised by this lock
+		self._writer = None
+		self._write_lock = threading.RLock()
+		# Separate connection of a full reload's shadow fill, open only inside bulk_load()
+		self._loader = None
+		# Search and category results are cached per data generation; bump_generation()
+		# is called after every change to products or category assignments
+		cache_config = cache_config or {}
+		self.generation = 0
+		self._generation_lock = threading.Lock()
+		self.result_cache = ResultCache(
+			max_entries=cache_config.get('max_entries', 256),
+			max_bytes=cache_config.get('max_bytes', 64 * 1024 * 1024)
+		)
+
+	@staticmethod
+	def _fts_options(prefix, tokenize) -> str:
+		"""The prefix= and tokenize= options of the products FTS5 table"""
+		if isinstance(prefix, (int, str)):
+			prefix = str(prefix).replace(',', ' ').split()
+		prefix_lengths = sorted(set(int(length) for length in prefix or [] if int(length) > 0))
+		options = ''
+		if prefix_lengths:
+			options += ",\n\tprefix='{}'".format(' '.join(str(length) for length in prefix_lengths))
+		if tokenize:
+			options += ",\n\ttokenize='{}'".format(str(tokenize).replace("'", "''"))
+		return options
+
+	def _fts_table_sql(self, table: str) -> str:
+		return PRODUCTS_FTS_SQL.format(table=table, options=self.fts_options)
+
+	def connect(self, readonly: bool = False):
+		"""Open a new database connection (pooled connections are handed out by reader() and writer())"""
+		connection = sqlite3.connect(self.db_path, check_same_thread=False)
+		connection.row_factory = sqlite3.Row
+		self._apply_pragmas(connection, self.sqlite_config, set_journal_mode=not readonly)
+		if readonly:
+			connection.execute("PRAGMA query_only = ON")
+		else:
+			# Rows removed by INSERT OR REPLACE only fire the FTS delete trigger with this on
+			connection.execute("PRAGMA recursive_triggers = ON")
+		return connection
+
+	@staticmethod
+	def _apply_pragmas(connection, pragmas: dict, set_journal_mode: bool = False):
+		"""Apply the performance pragmas of a sqlite: profile to a connection"""
+		for name in ('journal_mode', 'synchronous', 'cache_size', 'mmap_size', 'temp_store'):
+			if name not in pragmas or (name == 'journal_mode' and not set_journal_mode):
+				continue
+			value = pragmas[name]
+			if isinstance(value, bool):
+				# YAML reads unquoted ON/OFF as booleans
+				value = 'ON' if value else 'OFF'
+			# Pragmas take keywords or integers; anything else would be injected verbatim
+			if not (isinstance(value, int) or str(value).isalpha()):
+				logging.warning(f"Ignoring invalid sqlite pragma {name} = {value!r}")
+				continue
+			connection.execute(f"PRAGMA {name} = {value}")
+
+	@contextmanager
+	def bulk_load(self):
+		"""
+		Open a dedicated load connection with the bulk-load profile (relaxed sync, larger cache)
+		while a full reload fills the shadow tables; insert_products_batch writes the shadow table
+		through it. The shared write connection keeps the regular profile, so category edits made
+		during the fill stay durable. SQLite lets one connection write at a time, so edits wait for
+		the current batch, at most the connection timeout.
+		"""
+		loader = self.connect()
+		pragmas = dict(self.bulk_load_config)
+		journal_mode = loader.execute("PRAGMA journal_mode").fetchone()[0]
+		if journal_mode.lower() != 'wal' and 'synchronous' in pragmas:
+			# Without WAL the loader writes the shared database file itself, live pages included
+			logging.warning(f"Keeping the regular synchronous setting for the bulk load in journal mode {journal_mode}")
+			del pragmas['synchronous']
+		self._apply_pragmas(loader, pragmas)
+		# A checkpoint copies every connection's commits into the database file; leave them to
+		# the durable connections so an unsynced checkpoint cannot corrupt live data
+		loader.execute("PRAGMA wal_autocheckpoint = 0")
+		self._loader = loader
+		logging.info(f"SQLite bulk-load connection opened: {pragmas}")
+		try:
+			yield
+		finally:
+			self._loader = None
+			# Closing the last connection checkpoints; do that with the regular profile
+			self._apply_pragmas(loader, self.sqlite_config)
+			loader.close()
+			logging.info("SQLite bulk-load connection closed.")
+
+	@contextmanager
+	def _shadow_writer(self):
+		"""The bulk-load connection inside bulk_load(), the shared write connection otherwise"""
+		loader = self._loader
+		if loader is None:
+			with self.writer() as conn:
+				yield conn
+			return
+		with loader:
+			yield loader
+
+	@contextmanager
+	def reader(self):
+		"""Borrow a read-only pooled connection; blocks while max_readers connections are in use"""
+		self._reader_slots.acquire()
+		try:
+			try:
+				conn = self._readers.get_nowait()
+			except queue.Empty:
+				conn = self.connect(readonly=True)
+				with self._pool_lock:
+					self._reader_count += 1
+			try:
+				with conn:
+					yield conn
+			except BaseException:
+				# Don't return a connection in an unknown state to the pool
+				conn.close()
+				with self._pool_lock:
+					self._reader_count -= 1
+				raise
+			self._readers.put(conn)
+		finally:
+			self._reader_slots.release()
+
+	@contextmanager
+	def writer(self):
+		"""Use the dedicated write connection; commits on success and rolls back on error"""
+		with self._write_lock:
+			if self._writer is None:
+				self._writer = self.connect()
+			with self._writer:
+				yield self._writer
+
+	def bump_generation(self) -> int:
+		"""Mark cached query results as stale after products or categories changed"""
+		with self._generation_lock:
+			self.generation += 1
+			self.result_cache.clear()
+			# Persisted so the generation keeps increasing across restarts
+			try:
+				self.save_ingest_metadata({'generation': self.generation})
+			except sqlite3.Error as e:
+				logging.error(f"Error saving data generation: {e}")
+			return self.generation
+
+	def _cached(self, key: tuple, load):
+		"""Return the cached result for key in the current generation, loading it on a miss"""
+		if not self.result_cache.enabled:
+			return load()
+		key = (self.generation,) + key
+		hit, value = self.result_cache.get(key)
+		if hit:
+			return value
+		value = load()
+		self.result_cache.put(key, value)
+		return value
 
-	def connect(self):
-		"""Establish database connection"""
-		self.connection = sqlite3.connect(self.db_path)
-		self.connection.row_factory = sqlite3.Row
-		return self.connection
+	@staticmethod
+	def _normalize_search_term(search_term: str) -> str:
+		return ' '.join(search_term.lower().split())
 
 	def close(self):
-		"""Close database connection"""
-		if self.connection:
-			self.connection.close()
+		"""Close all pooled connections; they are reopened lazily if the database is used again"""
+		with self._write_lock:
+			if self._writer is not None:
+				self._writer.close()
+				self._writer = None
+		while True:
+			try:
+				conn = self._readers.get_nowait()
+			except queue.Empty:
+				break
+			conn.close()
+			with self._pool_lock:
+				self._reader_count -= 1
 
 	def drop_tables(self):
 		"""Drop products table but preserve product_categories"""
 		drop_tables_sql = [
 			"DROP TABLE IF EXISTS products",
-			"DROP TABLE IF EXISTS products_fts"
+			"DROP TABLE IF EXISTS products_fts",
+			# Fingerprints describe the dropped products, so they go too
+			"DROP TABLE IF EXISTS source_fingerprints"
 			# Note: We don't drop product_categories to preserve category assignments
 		]
-		with self.connect() as conn:
+		with self.writer() as conn:
 			for sql in drop_tables_sql:
 				conn.execute(sql)
 
-	def create_tables(self):
-		"""Create the products table with composite primary key and separate product_categories table"""
-		# Create main products table with composite primary key AND an id column for FTS
-		create_table_sql = """
-		CREATE TABLE IF NOT EXISTS products (
-			id INTEGER PRIMARY KEY AUTOINCREMENT,
-			settlement TEXT NOT NULL,
-			market_name TEXT NOT NULL,
-			item_name TEXT NOT NULL,
-			item_code TEXT NOT NULL,
-			item_retail_price REAL,
-			item_promotional_price REAL,
-			UNIQUE(market_name, item_code)
-		)
+	def create_tables(self, repair_fts: bool = False):
 		"""
-		# Create FTS5 virtual table for fast searching
-		create_fts_sql = """
-		CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
-			settlement,
-			market_name,
-			item_name,
-			item_code,
-			content='products',
-			content_rowid='id'
-		)
+		Create the products table with composite primary key and separate product_categories table.
+		:param repair_fts: Rebuild the full-text index from the products table.
 		"""
+		# Create main products table with composite primary key AND an id column for FTS
+		create_table_sql = PRODUCTS_TABLE_SQL.format(table='products', constraints=PRODUCTS_UNIQUE_CONSTRAINT)
+		# Create FTS5 virtual table for fast searching
+		create_fts_sql = self._fts_table_sql('products_fts')
 		# Create persistent product categories table
 		create_product_categories_sql = """
 		CREATE TABLE IF NOT EXISTS product_categories (
@@ -71,19 +336,133 @@ class Database:
 			name TEXT NOT NULL
 		)
 		"""
-		with self.connect() as conn:
+		# Fingerprints of the Paradox file each market was last loaded from (incremental mode)
+		create_source_fingerprints_sql = """
+		CREATE TABLE IF NOT EXISTS source_fingerprints (
+			market_name TEXT PRIMARY KEY,
+			path_to_db TEXT NOT NULL,
+			fingerprint TEXT NOT NULL,
+			updated_at TEXT NOT NULL
+		)
+		"""
+		# Run statistics and the data generation, kept up to date by each ingestion run
+		create_ingest_metadata_sql = """
+		CREATE TABLE IF NOT EXISTS ingest_metadata (
+			key TEXT PRIMARY KEY,
+			value TEXT NOT NULL
+		)
+		"""
+		# Markets that share category assignments by item_code (empty unless propagation is enabled)
+		create_market_groups_sql = """
+		CREATE TABLE IF NOT EXISTS market_groups (
+			market_name TEXT PRIMARY KEY,
+			group_id TEXT NOT NULL
+		)
+		"""
+		with self.writer() as conn:
 			conn.execute(create_table_sql)
 			conn.execute(create_fts_sql)
 			conn.execute(create_product_categories_sql)
 			conn.execute(create_categories_sql)
-			# Enable foreign keys
-			conn.execute("PRAGMA foreign_keys = ON")
-			# Populate FTS table with existing data (will be empty initially)
-			try:
-				conn.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
-			except Exception as e:
-				# If FTS table is empty, this might fail - that's OK
-				logging.info(f"FTS rebuild might have failed (normal if table is empty): {e}")
+			conn.execute(create_source_fingerprints_sql)
+			conn.execute(create_ingest_metadata_sql)
+			conn.execute(create_market_groups_sql)
+			conn.execute("CREATE INDEX IF NOT EXISTS market_groups_group ON market_groups(group_id)")
+			# Databases created before the triggers existed may hold an out-of-date index
+			has_triggers = conn.execute(
+				"SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = 'products_fts_insert'"
+			).fetchone() is not None
+			for sql in PRODUCTS_FTS_TRIGGERS_SQL:
+				conn.execute(sql)
+		with self._generation_lock:
+			self.generation = max(self.generation, int(self.get_ingest_metadata().get('generation', 0)))
+		if not self.migrate_fts_index() and (repair_fts or not has_triggers):
+			self.rebuild_fts_index()
+
+	def migrate_fts_index(self) -> bool:
+		"""
+		Recreate products_fts when its prefix indexes or tokenizer differ from the configured
+		ones (including databases created before they were configurable). Returns True if the
+		index was rebuilt.
+		"""
+		if self.get_ingest_metadata().get('fts_options') == self.fts_options:
+			return False
+		logging.info("FTS5 options changed - recreating products_fts...")
+		with self.writer() as conn:
+			conn.execute("DROP TABLE IF EXISTS products_fts")
+			conn.execute(self._fts_table_sql('products_fts'))
+			conn.execute("INSERT INTO products_fts(products_fts) VALUES('rebuild')")
+			conn.execute(
+				"INSERT OR REPLACE INTO ingest_metadata (key, value) VALUES ('fts_options', ?)",
+				(json.dumps(self.fts_options),)
+			)
+		self.bump_generation()
+		logging.info("products_fts recreated with the configured prefix indexes and tokenizer.")
+		return True
+
+	def create_shadow_tables(self):
+		"""Create empty shadow products tables for a full reload, discarding any left over from a failed run"""
+		self.drop_shadow_tables()
+		with self.writer() as conn:
+			# No unique index while loading; it is built once in swap_shadow_tables
+			conn.execute(PRODUCTS_TABLE_SQL.format(table=SHADOW_PRODUCTS_TABLE, constraints=''))
+			conn.execute(self._fts_table_sql(SHADOW_PRODUCTS_FTS))
+			# Products that are still there keep their id (see insert_products_batch); new ones must
+			# be numbered after every id the live table ever handed out so they never collide
+			conn.execute(
+				"INSERT INTO sqlite_sequence (name, seq) SELECT ?, seq FROM sqlite_sequence WHERE name = 'products'",
+				(SHADOW_PRODUCTS_TABLE,)
+			)
+		logging.info("Shadow products tables created.")
+
+	def drop_shadow_tables(self):
+		"""Drop the shadow products tables, leaving the live ones untouched"""
+		with self.writer() as conn:
+			conn.execute(f"DROP TABLE IF EXISTS {SHADOW_PRODUCTS_FTS}")
+			conn.execute(f"DROP TABLE IF EXISTS {SHADOW_PRODUCTS_TABLE}")
+
+	def swap_shadow_tables(self):
+		"""
+		Index the shadow products and swap them in for the live tables in one transaction.
+		Readers keep seeing the old data until the swap commits. The deferred unique index
+		is built inside the swap, once the live table holding the same index name is dropped.
+		"""
+		# Without the unique index duplicates were not replaced on insert; keep the last one
+		dedupe_sql = f"""
+		DELETE FROM {SHADOW_PRODUCTS_TABLE} WHERE id NOT IN (
+			SELECT MAX(id) FROM {SHADOW_PRODUCTS_TABLE} GROUP BY market_name, item_code
+		)
+		"""
+		populate_fts_sql = f"""
+		INSERT INTO {SHADOW_PRODUCTS_FTS}(rowid, settlement, market_name, item_name, item_code)
+		SELECT id, settlement, market_name, item_name, item_code FROM {SHADOW_PRODUCTS_TABLE}
+		"""
+		swap_sql = [
+			"DROP TABLE IF EXISTS products_fts",
+			"DROP TABLE IF EXISTS products",
+			# Built after the live table (and its index of the same name) is gone
+			f"CREATE UNIQUE INDEX products_market_item ON {SHADOW_PRODUCTS_TABLE}(market_name, item_code)",
+			f"ALTER TABLE {SHADOW_PRODUCTS_TABLE} RENAME TO products",
+			f"ALTER TABLE {SHADOW_PRODUCTS_FTS} RENAME TO products_fts",
+			# The live table's triggers were dropped along with it
+			*PRODUCTS_FTS_TRIGGERS_SQL,
+			# Every configured market was just reloaded; stale fingerprints must not survive
+			"DELETE FROM source_fingerprints"
+		]
+		try:
+			# The expensive indexing happens outside the swap so the swap itself is short
+			with self.writer() as conn:
+				conn.execute(dedupe_sql)
+				conn.execute(populate_fts_sql)
+			with self.writer() as conn:
+				conn.execute("BEGIN IMMEDIATE")
+				for sql in swap_sql:
+					conn.execute(sql)
+			logging.info("Shadow products tables swapped in.")
+			return True
+		except sqlite3.Error as e:
+			logging.error(f"Error swapping in shadow products tables: {e}")
+			raise e
 
 	def get_current_categories(self) -> dict:
 		"""
@@ -97,7 +476,7 @@ class Database:
 		"""
 		category_map = {}
 		try:
-			with self.connect() as conn:
+			with self.reader() as conn:
 				# Check if the table exists first
 				cursor = conn.execute("""
 					SELECT name FROM sqlite_master 
@@ -119,20 +498,28 @@ class Database:
 			logging.error(f"Error fetching current categories: {e}")
 		return category_map
 
-	def insert_products_batch(self, products_data: list) -> bool:
-		"""Insert multiple products into the database in a single transaction."""
+	def insert_products_batch(self, products_data: list, table: str = 'products') -> bool:
+		"""Insert multiple products into the database (or a shadow products table) in a single transaction."""
 		if not products_data:
 			logging.info("No products to insert for this batch.")
 			return True
 		
-		insert_sql = """
-		INSERT OR REPLACE INTO products
+		insert_sql = f"""
+		INSERT OR REPLACE INTO {table}
 		(settlement, market_name, item_name, item_code, item_retail_price, item_promotional_price)
 		VALUES (?, ?, ?, ?, ?, ?)
 		"""
+		if table == SHADOW_PRODUCTS_TABLE:
+			# A reload keeps the ids of existing products: the UI, selections and pagination
+			# cursors taken before the swap refer to them
+			insert_sql = f"""
+			INSERT OR REPLACE INTO {table}
+			(id, settlement, market_name, item_name, item_code, item_retail_price, item_promotional_price)
+			VALUES ((SELECT id FROM products WHERE market_name = ?2 AND item_code = ?4), ?1, ?2, ?3, ?4, ?5, ?6)
+			"""
 		
 		try:
-			with self.connect() as conn:
+			with (self._shadow_writer() if table == SHADOW_PRODUCTS_TABLE else self.writer()) as conn:
 				conn.executemany(insert_sql, products_data)
 				conn.commit()
 				logging.info(f"Successfully inserted batch of {len(products_data)} products.")
@@ -141,6 +528,161 @@ class Database:
 			logging.error(f"Error inserting batch of {len(products_data)} products: {e}")
 			raise e
 
+	def get_market_products(self, market_name: str) -> dict:
+		"""
+		Fetches the stored products of one market for row-level diffing.
+		Returns a dictionary mapping item_code to (settlement, item_name, item_retail_price, item_promotional_price).
+		"""
+		select_sql = """
+		SELECT item_code, settlement, item_name, item_retail_price, item_promotional_price
+		FROM products
+		WHERE market_name = ?
+		"""
+		try:
+			with self.reader() as conn:
+				cursor = conn.execute(select_sql, (market_name,))
+				return {row[0]: tuple(row[1:]) for row in cursor}
+		except sqlite3.Error as e:
+			logging.error(f"Error fetching products for market {market_name}: {e}")
+			raise e
+
+	def apply_products_delta(self, inserts: list, updates: list, deletes: list) -> bool:
+		"""
+		Applies a row-level diff in a single transaction.
+		:param inserts: Product tuples in insert_products_batch order.
+		:param updates: Product tuples in insert_products_batch order; matched on (market_name, item_code) so ids stay stable.
+		:param deletes: A list of (market_name, item_code) tuples.
+		"""
+		insert_sql = """
+		INSERT OR REPLACE INTO products
+		(settlement, market_name, item_name, item_code, item_retail_price, item_promotional_price)
+		VALUES (?, ?, ?, ?, ?, ?)
+		"""
+		update_sql = """
+		UPDATE products
+		SET settlement = ?, item_name = ?, item_retail_price = ?, item_promotional_price = ?
+		WHERE market_name = ? AND item_code = ?
+		"""
+		delete_sql = "DELETE FROM products WHERE market_name = ? AND item_code = ?"
+		
+		try:
+			with self.writer() as conn:
+				if deletes:
+					conn.executemany(delete_sql, deletes)
+				if updates:
+					conn.executemany(update_sql, [
+						(settlement, item_name, retail_price, promotional_price, market_name, item_code)
+						for settlement, market_name, item_name, item_code, retail_price, promotional_price in updates
+					])
+				if inserts:
+					conn.executemany(insert_sql, inserts)
+				logging.info(f"Applied product delta: {len(inserts)} inserted, {len(updates)} updated, {len(deletes)} deleted.")
+				return True
+		except sqlite3.Error as e:
+			logging.error(f"Error applying product delta: {e}")
+			raise e
+
+	def delete_products_not_in_markets(self, market_names: list) -> int:
+		"""Remove products (and their fingerprints) of markets that are no longer configured"""
+		if not market_names:
+			return 0
+		placeholders = ','.join('?' * len(market_names))
+		try:
+			with self.writer() as conn:
+				cursor = conn.execute(f"DELETE FROM products WHERE market_name NOT IN ({placeholders})", market_names)
+				conn.execute(f"DELETE FROM source_fingerprints WHERE market_name NOT IN ({placeholders})", market_names)
+				if cursor.rowcount > 0:
+					logging.info(f"Removed {cursor.rowcount} products of markets no longer in the configuration.")
+				return cursor.rowcount
+		except sqlite3.Error as e:
+			logging.error(f"Error removing products of unconfigured markets: {e}")
+			return 0
+
+	def get_source_fingerprints(self) -> dict:
+		"""Returns a dictionary mapping market_name to the fingerprint of its last loaded Paradox file"""
+		try:
+			with self.reader() as conn:
+				cursor = conn.execute("SELECT market_name, fingerprint FROM source_fingerprints")
+				return {row['market_name']: row['fingerprint'] for row in cursor}
+		except sqlite3.Error as e:
+			logging.error(f"Error fetching source fingerprints: {e}")
+			return {}
+
+	def save_source_fingerprints(self, fingerprints: list):
+		"""
+		Records the Paradox file fingerprint each market was loaded from.
+		:param fingerprints: A list of tuples (market_name, path_to_db, fingerprint).
+		"""
+		upsert_sql = """
+		INSERT OR REPLACE INTO source_fingerprints (market_name, path_to_db, fingerprint, updated_at)
+		VALUES (?, ?, ?, datetime('now'))
+		"""
+		try:
+			with self.writer() as conn:
+				conn.executemany(upsert_sql, fingerprints)
+		except sqlite3.Error as e:
+			logging.error(f"Error saving source fingerprints: {e}")
+			raise e
+
+	def get_ingest_metadata(self) -> dict:
+		"""Return everything stored in ingest_metadata, with the JSON values decoded"""
+		try:
+			with self.reader() as conn:
+				cursor = conn.execute("SELECT key, value FROM ingest_metadata")
+				return {row['key']: json.loads(row['value']) for row in cursor}
+		except sqlite3.Error as e:
+			logging.error(f"Error fetching ingest metadata: {e}")
+			return {}
+
+	def save_ingest_metadata(self, values: dict):
+		"""Store JSON-encodable values in ingest_metadata, replacing existing keys"""
+		upsert_sql = "INSERT OR REPLACE INTO ingest_metadata (key, value) VALUES (?, ?)"
+		with self.writer() as conn:
+			conn.executemany(upsert_sql, [(key, json.dumps(value, ensure_ascii=False)) for key, value in values.items()])
+
+	def record_ingest_run(self, started_at: str, duration: float, skipped_rows: int, skipped_by_market: dict, mode: str,
+			metrics: dict = None):
+		"""
+		Record the statistics of a successful ingestion run. The per-market row counts are
+		counted once here so that readiness checks and /api/stats never scan products.
+		metrics is the timing summary of the run, kept as last_run_metrics.
+		"""
+		count_sql = "SELECT market_name, COUNT(*) AS row_count FROM products GROUP BY market_name"
+		try:
+			with self.reader() as conn:
+				market_rows = {row['market_name']: row['row_count'] for row in conn.execute(count_sql)}
+			self.save_ingest_metadata({
+				'market_rows': market_rows,
+				'total_products': sum(market_rows.values()),
+				'last_run_started': started_at,
+				'last_run_duration': round(duration, 3),
+				'last_run_mode': mode,
+				'skipped_rows': skipped_rows,
+				'skipped_by_market': skipped_by_market,
+				'last_run_metrics': metrics
+			})
+		except sqlite3.Error as e:
+			logging.error(f"Error recording ingest run: {e}")
+
+	def has_products(self) -> bool:
+		"""Whether products have been loaded, without scanning the products table"""
+		total_products = self.get_ingest_metadata().get('total_products')
+		if total_products is not None:
+			return total_products > 0
+		# Databases loaded before ingest_metadata existed
+		try:
+			with self.reader() as conn:
+				return conn.execute("SELECT EXISTS (SELECT 1 FROM products)").fetchone()[0] == 1
+		except sqlite3.Error as e:
+			logging.error(f"Error checking for products: {e}")
+			return False
+
+	def get_stats(self) -> dict:
+		"""Run statistics from ingest_metadata plus the current data generation"""
+		stats = self.get_ingest_metadata()
+		stats['generation'] = self.generation
+		return stats
+
 	def update_categories_batch(self, category_assignments: list) -> bool:
 		"""
 		Updates the product_categories table for multiple products.
@@ -158,7 +700,7 @@ class Database:
 		"""
 		
 		try:
-			with self.connect() as conn:
+			with self.writer() as conn:
 				# Convert (category_code, market_name, item_code) to (market_name, item_code, category_code)
 				assignments_for_db = [(market_name, item_code, category_code)
 									for category_code, market_name, item_code in category_assignments]
@@ -171,169 +713,353 @@ class Database:
 			raise e
 
 	def rebuild_fts_index(self):
-		"""Rebuild the FTS5 index after bulk inserts."""
+		"""Rebuild the FTS5 index from scratch; the triggers keep it current otherwise, so this is only for repairs"""
 		rebuild_sql = "INSERT INTO products_fts(products_fts) VALUES('rebuild')"
 		try:
-			with self.connect() as conn:
+			with self.writer() as conn:
 				conn.execute(rebuild_sql)
-				logging.info("FTS5 index rebuilt successfully after batch inserts.")
+				logging.info("FTS5 index rebuilt successfully.")
 				return True
 		except sqlite3.Error as e:
 			logging.error(f"Error rebuilding FTS5 index: {e}")
 			return False
 
-	def search_products(self, search_term: str) -> list:
-		"""Search products using FTS5 and join with product_categories to get category info"""
-		if not search_term.strip():
-			return []
-		
-		search_words = search_term.strip().split()
+	@staticmethod
+	def _build_fts_queries(search_term: str) -> list:
+		"""Prefix FTS5 queries for a search term: the NEAR query first, then a plain AND fallback"""
+		search_words = [word for word in search_term.strip().split() if word]
 		if not search_words:
 			return []
-		
-		fts_conditions = []
-		for word in search_words:
-			if word:
-				fts_conditions.append(f'"{word}"*')
-		
-		if not fts_conditions:
-			return []
-		
+		fts_conditions = [f'"{word}"*' for word in search_words]
 		fts_query = ' NEAR('.join(fts_conditions) + ')' * (len(fts_conditions) - 1)
+		simple_query = ' AND '.join(fts_conditions)
+		return [fts_query, simple_query]
+
+	def search_products(self, search_term: str, limit: int = None, after: tuple = None) -> list:
+		"""
+		Search products using FTS5 and join with product_categories to get category info.
+		:param limit: Maximum number of rows to return (all rows if None).
+		:param after: Keyset cursor (search_rank, market_name, item_name, id) of the last row of the previous page.
+		"""
+		search_term = self._normalize_search_term(search_term)
+		return self._cached(
+			('search', search_term, limit, tuple(after) if after else None),
+			lambda: self._search_products(search_term, limit, after)
+		)
+
+	def _search_products(self, search_term: str, limit: int = None, after: tuple = None) -> list:
+		fts_queries = self._build_fts_queries(search_term)
+		if not fts_queries:
+			return []
 		
-		search_sql = """
-		SELECT p.*, pc.category_code as item_kzp_category_code
+		search_sql = f"""
+		SELECT p.*, pc.category_code as item_kzp_category_code, COALESCE(c.name, '') as item_kzp_category_name,
+			fts.rank as search_rank
 		FROM products p
 		JOIN products_fts fts ON p.id = fts.rowid
 		LEFT JOIN product_categories pc ON p.market_name = pc.market_name AND p.item_code = pc.item_code
+		LEFT JOIN categories c ON c.code = pc.category_code
 		WHERE products_fts MATCH ?
-		ORDER BY rank, p.market_name, p.item_name
+		{'AND (fts.rank, p.market_name, p.item_name, p.id) > (?, ?, ?, ?)' if after else ''}
+		ORDER BY fts.rank, p.market_name, p.item_name, p.id
+		{'LIMIT ?' if limit else ''}
 		"""
+		params = list(after or []) + ([limit] if limit else [])
 		
 		try:
-			with self.connect() as conn:
-				cursor = conn.execute(search_sql, (fts_query,))
+			with self.reader() as conn:
+				cursor = conn.execute(search_sql, [fts_queries[0]] + params)
 				return cursor.fetchall()
 		except sqlite3.Error as e:
 			print(f"Error searching products: {e}")
 			try:
-				simple_query = ' AND '.join([f'"{word}"*' for word in search_words if word])
-				cursor = conn.execute(search_sql, (simple_query,))
-				return cursor.fetchall()
+				with self.reader() as conn:
+					cursor = conn.execute(search_sql, [fts_queries[1]] + params)
+					return cursor.fetchall()
 			except:
 				return []
 
+	def count_search_results(self, search_term: str) -> int:
+		"""Count the matches of a search from the FTS index alone, without the joins"""
+		search_term = self._normalize_search_term(search_term)
+		return self._cached(('search_count', search_term), lambda: self._count_search_results(search_term))
+
+	def _count_search_results(self, search_term: str) -> int:
+		fts_queries = self._build_fts_queries(search_term)
+		if not fts_queries:
+			return 0
+		count_sql = "SELECT COUNT(*) FROM products_fts WHERE products_fts MATCH ?"
+		for fts_query in fts_queries:
+			try:
+				with self.reader() as conn:
+					return conn.execute(count_sql, (fts_query,)).fetchone()[0]
+			except sqlite3.Error as e:
+				print(f"Error counting search results: {e}")
+		return 0
+
 	def get_all_products(self) -> list:
 		"""Get all products from the database with their categories"""
 		select_sql = """
-		SELECT p.*, pc.category_code as item_kzp_category_code
+		SELECT p.*, pc.category_code as item_kzp_category_code, COALESCE(c.name, '') as item_kzp_category_name
 		FROM products p
 		LEFT JOIN product_categories pc ON p.market_name = pc.market_name AND p.item_code = pc.item_code
+		LEFT JOIN categories c ON c.code = pc.category_code
 		ORDER BY p.market_name, p.item_name
 		"""
 		
 		try:
-			with self.connect() as conn:
+			with self.reader() as conn:
 				cursor = conn.execute(select_sql)
 				return cursor.fetchall()
 		except sqlite3.Error as e:
 			print(f"Error getting all products: {e}")
 			return []
 
-	def update_product_category(self, product_ids: list, category_code: str) -> bool:
-		"""Update the category for multiple products in product_categories table"""
-		if not product_ids:
-			return True
-		
-		# Get the product details for the given IDs
-		placeholders = ','.join('?' * len(product_ids))
-		get_products_sql = f"""
-		SELECT market_name, item_code FROM products WHERE id IN ({placeholders})
+	@staticmethod
+	def _load_temp_ids(conn, table: str, ids: list):
+		"""Fill a temp table of product ids on this connection, so id lists never become bound variables"""
+		conn.execute(f"CREATE TEMP TABLE IF NOT EXISTS {table} (id INTEGER PRIMARY KEY)")
+		conn.execute(f"DELETE FROM temp.{table}")
+		conn.executemany(f"INSERT OR IGNORE INTO temp.{table} (id) VALUES (?)", ((int(product_id),) for product_id in ids))
+
+	def _selection_sql(self, conn, product_ids: list = None, search_term: str = None, in_category: str = None, exclude_ids: list = None) -> tuple:
 		"""
-		
-		update_sql = """
-		INSERT OR REPLACE INTO product_categories
-		(market_name, item_code, category_code)
-		VALUES (?, ?, ?)
+		Build the (market_name, item_code) pairs of a selection of products, either explicit ids or
+		everything matching a search and/or a current category, propagated to the other markets of
+		their market group. The pairs of exclude_ids are removed after propagation: an excluded
+		product keeps its category even when a copy of it in a grouped market is selected.
+		Returns (sql, params); id lists are loaded into temp tables on conn.
+		"""
+		conditions = []
+		params = []
+		if product_ids is not None:
+			self._load_temp_ids(conn, 'selected_ids', product_ids)
+			conditions.append("p.id IN (SELECT id FROM temp.selected_ids)")
+		if search_term is not None:
+			fts_queries = self._build_fts_queries(search_term)
+			if not fts_queries:
+				raise ValueError("Empty search selection")
+			conditions.append("p.id IN (SELECT rowid FROM products_fts WHERE products_fts MATCH ?)")
+			# The same query search_products shows the results of
+			params.append(fts_queries[0])
+		if in_category:
+			conditions.append("""EXISTS (
+				SELECT 1 FROM product_categories f
+				WHERE f.market_name = p.market_name AND f.item_code = p.item_code AND f.category_code = ?
+			)""")
+			params.append(in_category)
+		if not conditions:
+			raise ValueError("A selection needs product ids, a search or a category")
+		sql = f"""
+		WITH selected AS (SELECT p.market_name, p.item_code FROM products p WHERE {' AND '.join(conditions)})
+		{PROPAGATED_SELECTION_SQL}
+		"""
+		if exclude_ids:
+			self._load_temp_ids(conn, 'excluded_ids', exclude_ids)
+			# The compound select applies left to right: (selected UNION propagated) EXCEPT excluded
+			sql += "EXCEPT SELECT market_name, item_code FROM products WHERE id IN (SELECT id FROM temp.excluded_ids)"
+		return sql, params
+
+	def assign_category(self, category_code: str, product_ids: list = None, search_term: str = None, in_category: str = None, exclude_ids: list = None) -> int:
+		"""
+		Assign category_code to a selection of products (see _selection_sql), and to the same
+		item codes in the other markets of their market group, with one INSERT ... SELECT.
+		Returns the number of products assigned.
 		"""
-		
 		try:
-			with self.connect() as conn:
-				# Get product details
-				cursor = conn.execute(get_products_sql, product_ids)
-				products = cursor.fetchall()
-				
-				if not products:
-					return False
-				
-				# Update categories
-				assignments = [(product['market_name'], product['item_code'], category_code) for product in products]
-				conn.executemany(update_sql, assignments)
-				return True
+			with self.writer() as conn:
+				select_sql, params = self._selection_sql(conn, product_ids, search_term, in_category, exclude_ids)
+				cursor = conn.execute(f"""
+				INSERT OR REPLACE INTO product_categories (market_name, item_code, category_code)
+				SELECT market_name, item_code, ? FROM ({select_sql})
+				""", [category_code] + params)
+				return cursor.rowcount
 		except sqlite3.Error as e:
 			print(f"Error updating product categories: {e}")
-			return False
+			return -1
+
+	def unassign_category(self, product_ids: list = None, search_term: str = None, in_category: str = None, exclude_ids: list = None) -> int:
+		"""
+		Remove the category assignments of a selection of products (see _selection_sql), and of
+		the same item codes in the other markets of their market group, with one DELETE ... WHERE.
+		Returns the number of assignments removed.
+		"""
+		try:
+			with self.writer() as conn:
+				select_sql, params = self._selection_sql(conn, product_ids, search_term, in_category, exclude_ids)
+				cursor = conn.execute(f"""
+				DELETE FROM product_categories
+				WHERE (market_name, item_code) IN ({select_sql})
+				""", params)
+				return cursor.rowcount
+		except sqlite3.Error as e:
+			print(f"Error removing product categories: {e}")
+			return -1
+
+	def save_market_groups(self, market_groups: dict):
+		"""
+		Replace the market groups used for category propagation.
+		:param market_groups: Maps market_name to a group id; an empty dict disables propagation.
+		"""
+		with self.writer() as conn:
+			conn.execute("DELETE FROM market_groups")
+			conn.executemany(
+				"INSERT INTO market_groups (market_name, group_id) VALUES (?, ?)",
+				list(market_groups.items())
+			)
+
+	def inherit_group_categories(self) -> int:
+		"""
+		Give uncategorized products the category the same item_code has in another market of
+		their group, e.g. after a market was added. Existing assignments are kept.
+		Returns the number of products that inherited a category.
+		"""
+		inherit_sql = """
+		INSERT OR IGNORE INTO product_categories (market_name, item_code, category_code)
+		SELECT p.market_name, p.item_code, MIN(pc.category_code)
+		FROM market_groups g1
+		JOIN products p ON p.market_name = g1.market_name
+		JOIN market_groups g2 ON g2.group_id = g1.group_id AND g2.market_name != g1.market_name
+		JOIN product_categories pc ON pc.market_name = g2.market_name AND pc.item_code = p.item_code
+		GROUP BY p.market_name, p.item_code
+		"""
+		try:
+			with self.writer() as conn:
+				inherited_count = conn.execute(inherit_sql).rowcount
+				if inherited_count > 0:
+					logging.info(f"{inherited_count} products inherited categories from their market group.")
+				return inherited_count
+		except sqlite3.Error as e:
+			logging.error(f"Error inheriting group categories: {e}")
+			return 0
+
+	def update_product_category(self, product_ids: list, category_code: str) -> bool:
+		"""Update the category for multiple products in product_categories table"""
+		if not product_ids:
+			return True
+		return self.assign_category(category_code, product_ids=product_ids) > 0
 
 	def remove_product_category(self, product_ids: list) -> bool:
 		"""Remove category assignments for multiple products"""
 		if not product_ids:
 			return True
-		
-		# Get the product details for the given IDs
-		placeholders = ','.join('?' * len(product_ids))
-		get_products_sql = f"""
-		SELECT market_name, item_code FROM products WHERE id IN ({placeholders})
+		return self.unassign_category(product_ids=product_ids) >= 0
+
+	def get_products_by_category(self, category_code: str = None, limit: int = None, after: tuple = None) -> list:
 		"""
-		
-		delete_sql = """
-		DELETE FROM product_categories 
-		WHERE market_name = ? AND item_code = ?
+		Get products filtered by category from product_categories table.
+		:param limit: Maximum number of rows to return (all rows if None).
+		:param after: Keyset cursor (market_name, item_name, id) of the last row of the previous page.
+		"""
+		return self._cached(
+			('category', category_code or None, limit, tuple(after) if after else None),
+			lambda: self._get_products_by_category(category_code, limit, after)
+		)
+
+	def _get_products_by_category(self, category_code: str = None, limit: int = None, after: tuple = None) -> list:
+		conditions = []
+		params = []
+		if category_code:
+			conditions.append("pc.category_code = ?")
+			params.append(category_code)
+		if after:
+			conditions.append("(p.market_name, p.item_name, p.id) > (?, ?, ?)")
+			params.extend(after)
+		if limit:
+			params.append(limit)
+		select_sql = f"""
+		SELECT p.*, pc.category_code as item_kzp_category_code, COALESCE(c.name, '') as item_kzp_category_name
+		FROM products p
+		JOIN product_categories pc ON p.market_name = pc.market_name AND p.item_code = pc.item_code
+		LEFT JOIN categories c ON c.code = pc.category_code
+		{'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+		ORDER BY p.market_name, p.item_name, p.id
+		{'LIMIT ?' if limit else ''}
 		"""
 		
 		try:
-			with self.connect() as conn:
-				# Get product details
-				cursor = conn.execute(get_products_sql, product_ids)
-				products = cursor.fetchall()
-				
-				if not products:
-					return False
-				
-				# Remove category assignments
-				assignments = [(product['market_name'], product['item_code']) for product in products]
-				conn.executemany(delete_sql, assignments)
-				return True
+			with self.reader() as conn:
+				cursor = conn.execute(select_sql, params)
+				return cursor.fetchall()
 		except sqlite3.Error as e:
-			print(f"Error removing product categories: {e}")
-			return False
+			print(f"Error getting products by category: {e}")
+			return []
+
+	def iter_categorized_products(self, category_codes: list = None, settlement: str = None, market_name: str = None, batch_size: int = 1000):
+		"""
+		Yield categorized products one at a time straight from a cursor, for exports that
+		must not hold the whole result in memory. Bypasses the result cache and the reader pool.
+		:param category_codes: Only these categories (all categories if empty).
+		:param settlement: Only products of this settlement code.
+		:param market_name: Only products of this market (name and address, as stored).
+		"""
+		conditions = []
+		params = []
+		if category_codes:
+			conditions.append(f"pc.category_code IN ({','.join('?' * len(category_codes))})")
+			params.extend(category_codes)
+		if settlement:
+			conditions.append("p.settlement = ?")
+			params.append(settlement)
+		if market_name:
+			conditions.append("p.market_name = ?")
+			params.append(market_name)
+		select_sql = f"""
+		SELECT p.*, pc.category_code as item_kzp_category_code, COALESCE(c.name, '') as item_kzp_category_name
+		FROM products p
+		JOIN product_categories pc ON p.market_name = pc.market_name AND p.item_code = pc.item_code
+		LEFT JOIN categories c ON c.code = pc.category_code
+		{'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+		ORDER BY p.market_name, p.item_name, p.id
+		"""
+		# A stream stays open for as long as a slow download takes, so it gets a connection of its
+		# own instead of holding one of the pooled reader slots searches wait for
+		conn = self.connect(readonly=True)
+		try:
+			cursor = conn.execute(select_sql, params)
+			while True:
+				rows = cursor.fetchmany(batch_size)
+				if not rows:
+					break
+				yield from rows
+		finally:
+			conn.close()
 
-	def get_products_by_category(self, category_code: str = None) -> list:
-		"""Get products filtered by category from product_categories table"""
+	def get_categorized_locations(self) -> tuple:
+		"""Return (settlements, market_names) that have at least one categorized product"""
+		select_sql = """
+		SELECT DISTINCT p.settlement, p.market_name
+		FROM products p
+		JOIN product_categories pc ON p.market_name = pc.market_name AND p.item_code = pc.item_code
+		"""
+		try:
+			with self.reader() as conn:
+				rows = conn.execute(select_sql).fetchall()
+		except sqlite3.Error as e:
+			logging.error(f"Error listing categorized settlements and markets: {e}")
+			return [], []
+		return sorted(set(row['settlement'] for row in rows)), sorted(set(row['market_name'] for row in rows))
+
+	def count_products_by_category(self, category_code: str = None) -> int:
+		"""Count categorized products (optionally of one category) from product_categories alone"""
+		return self._cached(
+			('category_count', category_code or None),
+			lambda: self._count_products_by_category(category_code)
+		)
+
+	def _count_products_by_category(self, category_code: str = None) -> int:
 		if category_code:
-			select_sql = """
-			SELECT p.*, pc.category_code as item_kzp_category_code
-			FROM products p
-			JOIN product_categories pc ON p.market_name = pc.market_name AND p.item_code = pc.item_code
-			WHERE pc.category_code = ?
-			ORDER BY p.market_name, p.item_name
-			"""
+			count_sql = "SELECT COUNT(*) FROM product_categories WHERE category_code = ?"
 			params = [category_code]
 		else:
-			select_sql = """
-			SELECT p.*, pc.category_code as item_kzp_category_code
-			FROM products p
-			JOIN product_categories pc ON p.market_name = pc.market_name AND p.item_code = pc.item_code
-			ORDER BY p.market_name, p.item_name
-			"""
+			count_sql = "SELECT COUNT(*) FROM product_categories"
 			params = []
-		
 		try:
-			with self.connect() as conn:
-				cursor = conn.execute(select_sql, params)
-				return cursor.fetchall()
+			with self.reader() as conn:
+				return conn.execute(count_sql, params).fetchone()[0]
 		except sqlite3.Error as e:
-			print(f"Error getting products by category: {e}")
-			return []
+			print(f"Error counting products by category: {e}")
+			return 0
 
 	def get_category_name(self, category_code: str) -> str:
 		"""Get category name by code"""
@@ -342,7 +1068,7 @@ class Database:
 		
 		select_sql = "SELECT name FROM categories WHERE code = ?"
 		try:
-			with self.connect() as conn:
+			with self.reader() as conn:
 				cursor = conn.execute(select_sql, [category_code])
 				result = cursor.fetchone()
 				return result['name'] if result else ""
@@ -354,7 +1080,7 @@ class Database:
 		"""Save category code to name mapping"""
 		insert_sql = "INSERT OR REPLACE INTO categories (code, name) VALUES (?, ?)"
 		try:
-			with self.connect() as conn:
+			with self.writer() as conn:
 				for code, name in categories.items():
 					conn.execute(insert_sql, [code, name])
 		except sqlite3.Error as e:
@@ -370,7 +1096,7 @@ class Database:
 		"""
 		
 		try:
-			with self.connect() as conn:
+			with self.writer() as conn:
 				cursor = conn.execute(cleanup_sql)
 				deleted_count = cursor.rowcount
 				if deleted_count > 0:
@@ -0,0 +1,171 @@
+import csv
+import io
+import os
+import json
+import shutil
+import hashlib
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+CSV_HEADER = [
+	'Населено място',
+	'Търговски обект',
+	'Наименование на продукта',
+	'Код на продукта',
+	'Категория',
+	'Цена на дребно',
+	'Цена в промоция'
+]
+
+INDEX_FILE = 'index.json'
+
+def product_csv_row(product) -> list:
+	return [
+		product['settlement'],
+		product['market_name'],
+		product['item_name'],
+		product['item_code'],
+		product['item_kzp_category_code'] or "",
+		str(product['item_retail_price']) if product['item_retail_price'] is not None else "",
+		str(product['item_promotional_price']) if product['item_promotional_price'] is not None else ""
+	]
+
+def generate_csv(products, batch_size: int = 500):
+	"""Render products as UTF-8 CSV, yielding a chunk every batch_size rows"""
+	buffer = io.StringIO()
+	writer = csv.writer(buffer, quoting=csv.QUOTE_ALL)
+	writer.writerow(CSV_HEADER)
+	for row_count, product in enumerate(products, 1):
+		writer.writerow(product_csv_row(product))
+		if row_count % batch_size == 0:
+			yield buffer.getvalue().encode('utf-8')
+			buffer.seek(0)
+			buffer.truncate()
+	if buffer.tell():
+		yield buffer.getvalue().encode('utf-8')
+
+class ExportBuilder:
+	"""
+	Pre-renders the KZP CSV export (all products, and one file per settlement and per market)
+	into a directory per data generation, so repeated downloads are plain file sends.
+	Builds run in the background once changes have settled for settle_seconds.
+	"""
+	def __init__(self, db, export_config: dict = None):
+		export_config = export_config or {}
+		self.db = db
+		self.enabled = export_config.get('enabled', True)
+		# Absolute, since Flask resolves relative paths in send_file against the app root
+		self.export_dir = os.path.abspath(export_config.get('directory', './exports'))
+		self.settle_seconds = float(export_config.get('settle_seconds', 10))
+		self.workers = max(1, int(export_config.get('workers', 4)))
+		self.built_generation = None
+		self._index = {}
+		self._timer = None
+		self._timer_lock = threading.Lock()
+		self._build_lock = threading.Lock()
+
+	@staticmethod
+	def _key(settlement: str = None, market_name: str = None) -> str:
+		if market_name:
+			return f"market:{market_name}"
+		if settlement:
+			return f"settlement:{settlement}"
+		return 'all'
+
+	@staticmethod
+	def _file_name(key: str) -> str:
+		# Market names are Cyrillic with spaces and punctuation; hash them into safe names
+		return 'all.csv' if key == 'all' else f"{key.split(':')[0]}_{hashlib.sha1(key.encode('utf-8')).hexdigest()[:16]}.csv"
+
+	def schedule(self, delay: float = None):
+		"""(Re)start the settle timer; the build runs once no change arrived for delay seconds"""
+		if not self.enabled:
+			return
+		with self._timer_lock:
+			if self._timer is not None:
+				self._timer.cancel()
+			self._timer = threading.Timer(self.settle_seconds if delay is None else delay, self._run_build)
+			self._timer.daemon = True
+			self._timer.start()
+
+	def _run_build(self):
+		try:
+			self.build()
+		except Exception as e:
+			logging.error(f"Error pre-rendering CSV exports: {e}")
+
+	def _render(self, directory: str, key: str) -> str:
+		kind, _, value = key.partition(':')
+		products = self.db.iter_categorized_products(
+			settlement=value if kind == 'settlement' else None,
+			market_name=value if kind == 'market' else None
+		)
+		file_name = self._file_name(key)
+		with open(os.path.join(directory, file_name), 'wb') as f:
+			for chunk in generate_csv(products):
+				f.write(chunk)
+		return file_name
+
+	def _load_index(self, generation: int) -> bool:
+		"""Adopt the files of a previous build of this generation (e.g. from before a restart)"""
+		try:
+			with open(os.path.join(self.export_dir, str(generation), INDEX_FILE), 'r', encoding='utf-8') as f:
+				self._index = json.load(f)
+		except (FileNotFoundError, ValueError):
+			return False
+		self.built_generation = generation
+		return True
+
+	def build(self) -> bool:
+		"""Render every export for the current generation; returns False if data changed meanwhile"""
+		with self._build_lock:
+			generation = self.db.generation
+			if self.built_generation == generation or self._load_index(generation):
+				return True
+			os.makedirs(self.export_dir, exist_ok=True)
+			generation_dir = os.path.join(self.export_dir, str(generation))
+			build_dir = generation_dir + '.tmp'
+			shutil.rmtree(build_dir, ignore_errors=True)
+			os.makedirs(build_dir)
+
+			settlements, market_names = self.db.get_categorized_locations()
+			keys = ['all'] + [self._key(settlement=s) for s in settlements] + [self._key(market_name=m) for m in market_names]
+			logging.info(f"Pre-rendering {len(keys)} CSV exports for data generation {generation}...")
+			with ThreadPoolExecutor(max_workers=self.workers) as executor:
+				index = dict(zip(keys, executor.map(lambda key: self._render(build_dir, key), keys)))
+
+			if self.db.generation != generation:
+				# Data changed while rendering; the change scheduled a fresh build
+				shutil.rmtree(build_dir, ignore_errors=True)
+				logging.info("Data changed during CSV pre-rendering - discarding the build.")
+				return False
+			with open(os.path.join(build_dir, INDEX_FILE), 'w', encoding='utf-8') as f:
+				json.dump(index, f, ensure_ascii=False)
+			shutil.rmtree(generation_dir, ignore_errors=True)
+			os.replace(build_dir, generation_dir)
+			self._index = index
+			self.built_generation = generation
+
+			# Exports of older generations can never be served again
+			for entry in os.listdir(self.export_dir):
+				if entry != str(generation):
+					shutil.rmtree(os.path.join(self.export_dir, entry), ignore_errors=True)
+			logging.info(f"CSV exports for data generation {generation} ready in {generation_dir}")
+			return True
+
+	def lookup(self, settlement: str = None, market_name: str = None):
+		"""
+		Return (path, etag) of the pre-rendered export for the filter, or None when it is not
+		built for the current generation (the caller then streams it from the database).
+		"""
+		generation = self.built_generation
+		if generation is None or generation != self.db.generation:
+			return None
+		file_name = self._index.get(self._key(settlement, market_name))
+		if not file_name:
+			return None
+		path = os.path.join(self.export_dir, str(generation), file_name)
+		if not os.path.exists(path):
+			return None
+		return path, f"{generation}-{file_name}"
@@ -0,0 +1,133 @@
+import sqlite3
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+from processor import ProcessingCancelled
+
+class IngestLock:
+	"""
+	Cross-process lock allowing one ingestion run per database. It is an exclusive
+	transaction on a small side-car SQLite file, so the operating system releases it
+	if the process holding it dies.
+	"""
+	def __init__(self, lock_path: str):
+		self.lock_path = lock_path
+		self._connection = None
+
+	def acquire(self) -> bool:
+		"""Take the lock without waiting; False if another process (or run) holds it"""
+		connection = sqlite3.connect(self.lock_path, timeout=0, isolation_level=None, check_same_thread=False)
+		try:
+			connection.execute("BEGIN EXCLUSIVE")
+		except sqlite3.OperationalError:
+			connection.close()
+			return False
+		self._connection = connection
+		return True
+
+	def release(self):
+		if self._connection is not None:
+			self._connection.close()
+			self._connection = None
+
+class Job:
+	"""One ingestion run: its state, cancellation flag and stage history"""
+	def __init__(self, reason: str):
+		self.id = uuid.uuid4().hex[:12]
+		self.reason = reason
+		self.state = 'queued'
+		self.created_at = datetime.now().isoformat(timespec='seconds')
+		self.finished_at = None
+		self.error = None
+		self.history = []
+		self.cancel_event = threading.Event()
+
+	def record(self, stage: str, message: str = ''):
+		self.history.append({'time': datetime.now().isoformat(timespec='seconds'), 'stage': stage, 'message': message})
+
+	def to_dict(self) -> dict:
+		return {
+			'id': self.id,
+			'reason': self.reason,
+			'state': self.state,
+			'created_at': self.created_at,
+			'finished_at': self.finished_at,
+			'error': self.error,
+			'cancel_requested': self.cancel_event.is_set(),
+			'history': list(self.history)
+		}
+
+class JobManager:
+	"""
+	Runs ingestion jobs one at a time in a background thread, guarded by an IngestLock,
+	and keeps the last max_jobs jobs with their status history.
+	"""
+	def __init__(self, lock_path: str, max_jobs: int = 20):
+		self.lock = IngestLock(lock_path)
+		self.max_jobs = max_jobs
+		self.jobs = OrderedDict()
+		self.current_job = None
+		self._lock = threading.Lock()
+
+	def submit(self, reason: str, run, prepare=None) -> tuple:
+		"""
+		Start run(job) in a background thread. Returns (job, None), or (None, error) when a
+		run is already active in this process or another process holds the ingest lock.
+		prepare(job), if given, is called before the thread starts (e.g. to reset the status).
+		"""
+		with self._lock:
+			if self.current_job is not None:
+				return None, 'Processing is already running'
+			if not self.lock.acquire():
+				return None, 'Processing is already running in another process'
+			job = Job(reason)
+			job.record('queued', f"Requested ({reason})")
+			self.current_job = job
+			self.jobs[job.id] = job
+			while len(self.jobs) > self.max_jobs:
+				self.jobs.popitem(last=False)
+			if prepare:
+				prepare(job)
+		thread = threading.Thread(target=self._run, args=(job, run), name=f"ingest-{job.id}")
+		thread.daemon = True
+		thread.start()
+		return job, None
+
+	def _run(self, job: Job, run):
+		job.state = 'running'
+		try:
+			run(job)
+			job.state = 'succeeded'
+		except ProcessingCancelled:
+			job.state = 'cancelled'
+		except Exception as e:
+			job.state = 'failed'
+			job.error = str(e)
+			logging.error(f"Ingestion job {job.id} failed: {e}")
+		finally:
+			job.finished_at = datetime.now().isoformat(timespec='seconds')
+			job.record(job.state, job.error or '')
+			with self._lock:
+				self.lock.release()
+				self.current_job = None
+
+	def cancel(self, job_id: str = None) -> bool:
+		"""Ask the running job (or job_id, if it is the running one) to stop at the next row"""
+		job = self.current_job
+		if job is None or (job_id and job.id != job_id):
+			return False
+		job.cancel_event.set()
+		job.record('cancelling', 'Cancellation requested')
+		return True
+
+	def is_running(self) -> bool:
+		return self.current_job is not None
+
+	def get(self, job_id: str):
+		return self.jobs.get(job_id)
+
+	def list_jobs(self) -> list:
+		return [job.to_dict() for job in reversed(self.jobs.values())]
@@ -0,0 +1,111 @@
+import bisect
+import threading
+import time
+
+# Upper bounds in seconds; search is expected in milliseconds, uncached exports in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+class StageTimer:
+	"""
+	Splits an ingestion run into consecutive stages and adds up the wall-clock seconds of
+	each. switch() ends the current stage and starts the next one, so the stages always
+	add up to the duration of the run.
+	"""
+	def __init__(self):
+		self.seconds = {}
+		self.stage = None
+		self._started = None
+
+	def switch(self, stage: str) -> str:
+		"""Start stage (None to stop timing) and return the stage that was running"""
+		now = time.perf_counter()
+		previous = self.stage
+		if previous is not None:
+			self.seconds[previous] = self.seconds.get(previous, 0.0) + now - self._started
+		self.stage = stage
+		self._started = now
+		return previous
+
+	def stop(self):
+		self.switch(None)
+
+class Histogram:
+	"""Thread-safe cumulative histogram with one label, rendered in Prometheus text format"""
+	def __init__(self, name: str, help_text: str, label: str, buckets: tuple = LATENCY_BUCKETS):
+		self.name = name
+		self.help_text = help_text
+		self.label = label
+		self.buckets = tuple(sorted(buckets))
+		self._series = {}
+		self._lock = threading.Lock()
+
+	def observe(self, label_value: str, value: float):
+		with self._lock:
+			series = self._series.get(label_value)
+			if series is None:
+				series = self._series[label_value] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0, 'count': 0}
+			series['counts'][bisect.bisect_left(self.buckets, value)] += 1
+			series['sum'] += value
+			series['count'] += 1
+
+	def time_stream(self, label_value: str, chunks, started: float = None):
+		"""Pass a streamed response through, observing the time until its last chunk was sent"""
+		started = time.perf_counter() if started is None else started
+		try:
+			yield from chunks
+		finally:
+			self.observe(label_value, time.perf_counter() - started)
+
+	def render(self) -> list:
+		lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+		with self._lock:
+			for label_value, series in sorted(self._series.items()):
+				cumulative = 0
+				for bound, count in zip(self.buckets + (float('inf'),), series['counts']):
+					cumulative += count
+					le = '+Inf' if bound == float('inf') else repr(bound)
+					lines.append(sample(f"{self.name}_bucket", cumulative, {self.label: label_value, 'le': le}))
+				lines.append(sample(f"{self.name}_sum", round(series['sum'], 6), {self.label: label_value}))
+				lines.append(sample(f"{self.name}_count", series['count'], {self.label: label_value}))
+		return lines
+
+def _escape(value) -> str:
+	return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def sample(name: str, value, labels: dict = None) -> str:
+	"""One Prometheus sample line"""
+	if labels:
+		label_text = ','.join(f'{key}="{_escape(label_value)}"' for key, label_value in labels.items())
+		return f"{name}{{{label_text}}} {value}"
+	return f"{name} {value}"
+
+def _family(name: str, help_text: str, metric_type: str, samples: list) -> list:
+	lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+	lines.extend(sample(name, value, labels) for labels, value in samples)
+	return lines
+
+def gauge(name: str, help_text: str, samples: list) -> list:
+	"""Lines of a gauge family from [(labels or None, value), ...]"""
+	return _family(name, help_text, 'gauge', samples)
+
+def counter(name: str, help_text: str, samples: list) -> list:
+	"""Lines of a counter family from [(labels or None, value), ...]"""
+	return _family(name, help_text, 'counter', samples)
+
+def render_last_run(run: dict) -> list:
+	"""Gauges describing the last successful ingestion run (see DataProcessor.run_metrics)"""
+	if not run:
+		return []
+	markets = run.get('markets', {})
+	lines = []
+	lines += gauge('kzp_ingest_last_run_duration_seconds', 'Duration of the last ingestion run',
+		[(None, run.get('duration_seconds', 0))])
+	lines += gauge('kzp_ingest_last_run_stage_seconds', 'Seconds spent per stage in the last ingestion run',
+		[({'stage': stage}, seconds) for stage, seconds in run.get('stages', {}).items()])
+	lines += gauge('kzp_ingest_last_run_rows', 'Rows decoded and inserted in the last ingestion run',
+		[({'kind': 'decoded'}, run.get('rows_decoded', 0)), ({'kind': 'inserted'}, run.get('rows_inserted', 0))])
+	lines += gauge('kzp_ingest_last_run_skipped_rows', 'Rows skipped in the last ingestion run, by reason',
+		[({'reason': reason}, count) for reason, count in run.get('skipped_by_reason', {}).items()])
+	lines += gauge('kzp_ingest_last_run_market_rows_per_second', 'Decode and insert throughput per market in the last ingestion run',
+		[({'market': market_name}, market['rows_per_second']) for market_name, market in markets.items()])
+	return lines
@@ -1,19 +1,86 @@
 from pypxlib import Table
-from database import Database
+from database import Database, SHADOW_PRODUCTS_TABLE
+from backup import BackupManager
+from metrics import StageTimer
 import sys
 import time
+import contextlib
 import os
 import logging
-import shutil
+import hashlib
+import json
+import multiprocessing
+import queue
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+class ProcessingCancelled(Exception):
+	"""Raised inside an ingestion run once cancellation was requested"""
+
+class SkippedRowSink:
+	"""
+	Buffered JSONL sink for skipped rows. Rows are written in batches and counted per
+	market and reason, so thousands of inactive rows cost no per-row file I/O or logging.
+	"""
+	def __init__(self, file_path: str, buffer_size: int = 1000):
+		self.file_path = file_path
+		self.buffer_size = buffer_size
+		self.buffer = []
+		# {db market name ("name address", as in products.market_name): {reason_code: count}}
+		self.counts = {}
+		self.file = open(file_path, 'w', encoding='utf-8')
+
+	def add(self, market_name: str, row_num: int, product_data: tuple, reason: tuple):
+		"""Record a skipped row; reason is a (reason_code, detail) tuple"""
+		reason_code, detail = reason
+		market_counts = self.counts.setdefault(market_name, {})
+		market_counts[reason_code] = market_counts.get(reason_code, 0) + 1
+		self.buffer.append(json.dumps({
+			'market': market_name,
+			'row': row_num,
+			'reason': reason_code,
+			'detail': detail,
+			'settlement': product_data[0],
+			'market_name': product_data[1],
+			'item_name': product_data[2],
+			'item_code': product_data[3],
+			'retail_price': product_data[4]
+		}, ensure_ascii=False))
+		if len(self.buffer) >= self.buffer_size:
+			self.flush()
+
+	def flush(self):
+		if self.buffer:
+			self.file.write('\n'.join(self.buffer) + '\n')
+			self.buffer = []
+
+	def close(self):
+		self.flush()
+		self.file.close()
+
 class DataProcessor:
-	def __init__(self, markets: list, db: Database, status_dict: dict, category_assignments: dict = None):
+	def __init__(self, markets: list, db: Database, status_dict: dict, workers: int = 1,
+			incremental: bool = False, fingerprint: str = 'stat', backup_config: dict = None, cancel_event=None,
+			stage_callback=None, reader=None):
 		self.markets = markets
 		self.db = db
 		self.status = status_dict
-		self.category_assignments = category_assignments or {}
+		self.workers = max(1, int(workers or 1))
+		self.incremental = incremental
+		self.fingerprint_mode = fingerprint
+		self.backup_config = backup_config or {}
+		# Checked in the row loop; set it (e.g. from a JobManager) to stop the run
+		self.cancel_event = cancel_event
+		# Called with (stage, message) whenever the stage changes
+		self.stage_callback = stage_callback
+		# Opens a Paradox file like pypxlib.Table; benchmarks plug in synthetic tables here
+		self.reader = reader or Table
 		self.log_file = './skipped_rows.log'
+		# One JSON object per skipped row; see SkippedRowSink
+		self.skipped_rows_file = './skipped_rows.jsonl'
+
+	def _start_log(self):
+		"""Start a fresh skipped-rows log for this run"""
 		with open(self.log_file, 'w', encoding='utf-8') as f:
 			f.write("Skipped rows log - Started at: " + time.strftime("%Y-%m-%d %H:%M:%S") + "\n")
 			f.write("=" * 80 + "\n")
@@ -28,62 +95,20 @@ class DataProcessor:
 
 	def _create_backup(self):
 		"""Create a backup of the current SQLite database - MANDATORY first step"""
-		backup_dir = './backup'
-		current_db_path = './products.sqlite'
-		
+		self._set_stage('backup')
 		self._update_status("Backup", 0, "Starting database backup...")
 		logging.info("Starting database backup process")
 		
-		# Create backup directory if it doesn't exist
-		if not os.path.exists(backup_dir):
-			os.makedirs(backup_dir)
-			logging.info(f"Created backup directory: {backup_dir}")
-		
-		# Check if source database exists
-		if not os.path.exists(current_db_path):
-			error_msg = f"Cannot create backup: Source database not found: {current_db_path}"
-			logging.error(error_msg)
-			self._update_status("Backup Failed", 0, error_msg)
-			return None
-		
-		# Generate backup filename with date and incrementing ID
-		today = datetime.now().strftime('%Y%m%d_%H%M%S')
-		backup_pattern = f"products_{today}_"
-		
-		# Find existing backups for this exact timestamp to determine next ID
-		existing_backups = []
-		for filename in os.listdir(backup_dir):
-			if filename.startswith(backup_pattern) and filename.endswith('.sqlite'):
-				try:
-					# Extract the ID from filename: products_YYYYMMDD_HHMMSS_ID.sqlite
-					id_part = filename.replace(backup_pattern, '').replace('.sqlite', '')
-					backup_id = int(id_part)
-					existing_backups.append(backup_id)
-				except ValueError:
-					continue
-		
-		# Determine next backup ID
-		next_id = 1
-		if existing_backups:
-			next_id = max(existing_backups) + 1
-		
-		# Create backup filename
-		backup_filename = f"products_{today}_{next_id}.sqlite"
-		backup_path = os.path.join(backup_dir, backup_filename)
+		def on_progress(progress, message):
+			self._update_status("Backup", progress, message)
 		
-		try:
-			# Copy the database file
-			self._update_status("Backup", 0, f"Creating backup: {backup_filename}")
-			shutil.copy2(current_db_path, backup_path)
-			success_msg = f"Database backup created successfully: {backup_path}"
-			logging.info(success_msg)
-			self._update_status("Backup Complete", 0, success_msg)
-			return backup_path
-		except Exception as e:
-			error_msg = f"Failed to create database backup: {e}"
-			logging.error(error_msg)
-			self._update_status("Backup Failed", 0, error_msg)
-			return None
+		backup_manager = BackupManager(self.db.db_path, './backup', self.backup_config, progress_callback=on_progress)
+		backup_path = backup_manager.create_backup()
+		if backup_path:
+			self._update_status("Backup Complete", 0, f"Database backup ready: {backup_path}")
+		else:
+			self._update_status("Backup Failed", 0, "Failed to create database backup")
+		return backup_path
 
 	def _update_status(self, market_name: str, progress: int, message: str):
 		"""Update the global processing status"""
@@ -91,221 +116,591 @@ class DataProcessor:
 		self.status['progress'] = progress
 		self.status['message'] = message
 
-	def _count_total_rows(self):
-		"""Count total rows across all markets for progress tracking"""
-		total_rows = 0
+	def _set_stage(self, stage: str):
+		"""Record the current processing stage (backup, decode, insert, fts, done)"""
+		if self.stage_callback and self.status.get('stage') != stage:
+			self.stage_callback(stage, self.status.get('message', ''))
+		self.status['stage'] = stage
+
+	def _check_cancelled(self):
+		if self.cancel_event is not None and self.cancel_event.is_set():
+			raise ProcessingCancelled("Processing cancelled")
+
+	def _group_markets_by_source(self):
+		"""Group markets by Paradox file so each physical file is decoded only once"""
+		groups = {}
 		for market_info in self.markets:
+			source_key = os.path.normcase(os.path.abspath(market_info['path_to_db']))
+			groups.setdefault(source_key, []).append(market_info)
+		return list(groups.values())
+
+	def _fingerprint_source(self, path_to_db: str) -> str:
+		"""
+		Fingerprint a Paradox file (and its .MB blob file, if any).
+		'stat' uses size and mtime; 'hash' uses a SHA-256 of the contents.
+		"""
+		paths = [path_to_db]
+		blob_path = path_to_db.replace('.db', '.mb').replace('.DB', '.MB')
+		if blob_path != path_to_db and os.path.isfile(blob_path):
+			paths.append(blob_path)
+		parts = []
+		for path in paths:
+			if self.fingerprint_mode == 'hash':
+				digest = hashlib.sha256()
+				with open(path, 'rb') as f:
+					for block in iter(lambda: f.read(1024 * 1024), b''):
+						digest.update(block)
+				parts.append(digest.hexdigest())
+			else:
+				stat = os.stat(path)
+				parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+		return '|'.join(parts)
+
+	def _fingerprint_sources(self, source_groups: list) -> dict:
+		"""Map each distinct path_to_db to its current fingerprint (None if it cannot be read)"""
+		fingerprints = {}
+		for group in source_groups:
+			path_to_db = group[0]['path_to_db']
+			try:
+				fingerprints[path_to_db] = self._fingerprint_source(path_to_db)
+			except OSError as e:
+				logging.warning(f"Could not fingerprint {path_to_db}: {e}")
+				fingerprints[path_to_db] = None
+		return fingerprints
+
+	def _select_changed_sources(self, source_groups: list) -> list:
+		"""Drop the file groups whose markets were all loaded from an identical file last time"""
+		stored = self.db.get_source_fingerprints()
+		changed_groups = []
+		for group in source_groups:
+			path_to_db = group[0]['path_to_db']
+			fingerprint = self.source_fingerprints.get(path_to_db)
+			unchanged = fingerprint is not None and all(
+				stored.get(f"{market_info['name']} {market_info['address']}") == fingerprint for market_info in group
+			)
+			if unchanged:
+				self.market_count += len(group)
+				logging.info(f"Skipping unchanged file {path_to_db} ({len(group)} markets)")
+				print(f"Skipping unchanged file {path_to_db} ({len(group)} markets)")
+			else:
+				changed_groups.append(group)
+		return changed_groups
+
+	def has_changed_sources(self) -> bool:
+		"""Whether any Paradox file differs from the one its markets were last loaded from"""
+		source_groups = self._group_markets_by_source()
+		self.source_fingerprints = self._fingerprint_sources(source_groups)
+		self.market_count = 0
+		return bool(self._select_changed_sources(source_groups))
+
+	def _count_source_rows(self, source_groups: list) -> list:
+		"""Return the header record count of every distinct Paradox file, in group order"""
+		row_counts = []
+		for group in source_groups:
+			try:
+				with self.reader(group[0]['path_to_db'], encoding='windows-1251') as table:
+					row_counts.append(len(table))
+			except Exception as e:
+				logging.warning(f"Could not count rows for {group[0]['path_to_db']}: {e}")
+				row_counts.append(0)
+		return row_counts
+
+	@staticmethod
+	def _decode_row(row):
+		"""
+		Decode and validate a Paradox row once, independently of the market it is sent to.
+		Returns a tuple (fields, skip_reason) where fields is (item_name, item_code, client_price)
+		for valid rows and a best-effort (item, id, price) tuple for logging skipped rows, and
+		skip_reason is None or a (reason_code, detail) tuple.
+		"""
+		item = row.Item if hasattr(row, 'Item') else None
+		item_id = row.id if hasattr(row, 'id') else None
+		client_price = row.ClientPrice if hasattr(row, 'ClientPrice') else None
+
+		def raw_fields():
+			try:
+				price = float(client_price) if client_price is not None else 0.0
+			except (ValueError, TypeError):
+				price = None
+			return (
+				str(item) if item is not None else None,
+				str(item_id) if item_id is not None else None,
+				price
+			)
+
+		# Check Act column - skip if not equal to '*'
+		if row.Act != '*':
+			return raw_fields(), ('inactive', f"Act column not equal to '*' (value: {row.Act})")
+
+		# Pre-validate row attributes
+		missing_attributes = []
+		if item is None:
+			missing_attributes.append('Item')
+		if item_id is None:
+			missing_attributes.append('id')
+		if client_price is None:
+			missing_attributes.append('ClientPrice')
+		if missing_attributes:
+			return raw_fields(), ('missing_attributes', f"Missing attributes: {missing_attributes}")
+
+		try:
+			return (str(item), str(item_id), float(client_price)), None
+		except (ValueError, TypeError) as e:
+			return raw_fields(), ('format_error', f"Data format error during preparation: {e}")
+
+	def _publish_skip_counts(self):
+		"""Expose the skipped-row counters (total and per market and reason) in the status"""
+		self.status['skipped_rows'] = self.skipped_rows
+		self.status['skipped_by_market'] = {
+			market_name: dict(reason_counts) for market_name, reason_counts in self.skip_sink.counts.items()
+		}
+
+	def _run_metrics(self) -> dict:
+		"""Timing and throughput summary of this run, served as JSON and on /metrics"""
+		skipped_by_reason = {}
+		if self.skip_sink:
+			for reason_counts in self.skip_sink.counts.values():
+				for reason, count in reason_counts.items():
+					skipped_by_reason[reason] = skipped_by_reason.get(reason, 0) + count
+		return {
+			'started_at': self.run_started_at,
+			'mode': 'incremental' if self.incremental else 'full',
+			'duration_seconds': round(time.time() - self.run_started, 3),
+			'stages': {stage: round(seconds, 3) for stage, seconds in self.timer.seconds.items()},
+			'rows_decoded': self.processed_rows,
+			'rows_inserted': self.total_inserted,
+			'skipped_rows': self.skipped_rows,
+			'skipped_by_reason': skipped_by_reason,
+			'markets': self.market_metrics
+		}
+
+	def _record_run(self):
+		"""Store the statistics of a successful run in ingest_metadata"""
+		self.timer.stop()
+		# Markets read this run, including those without skipped rows
+		skipped_by_market = {market_name: 0 for market_name in self.market_metrics}
+		if self.skip_sink:
+			for market_name, reason_counts in self.skip_sink.counts.items():
+				skipped_by_market[market_name] = sum(reason_counts.values())
+		skipped_rows = self.skipped_rows
+		if self.incremental:
+			# Only changed files were read; the other configured markets keep the counts of the
+			# run that last read them, so the totals still cover every market in market_rows
+			configured_markets = {f"{market_info['name']} {market_info['address']}" for market_info in self.markets}
+			stored = self.db.get_ingest_metadata().get('skipped_by_market') or {}
+			skipped_by_market = {
+				**{market_name: count for market_name, count in stored.items() if market_name in configured_markets},
+				**skipped_by_market
+			}
+			skipped_rows = sum(skipped_by_market.values())
+		self.run_metrics = self._run_metrics()
+		self.db.record_ingest_run(
+			started_at=self.run_started_at,
+			duration=time.time() - self.run_started,
+			skipped_rows=skipped_rows,
+			skipped_by_market=skipped_by_market,
+			mode=self.run_metrics['mode'],
+			metrics=self.run_metrics
+		)
+
+	def _new_targets(self, group: list) -> list:
+		"""Per-market batch state; every decoded row of a file is fanned out to all of its markets"""
+		targets = []
+		for market_info in group:
+			targets.append({
+				'info': market_info,
+				'db_market_name': f"{market_info['name']} {market_info['address']}",
+				'batch': []
+			})
+		return targets
+
+	def _dispatch_rows(self, targets: list, decoded_rows, file_label: str, file_rows: int):
+		"""Add decoded (row_num, fields, skip_reason) rows to the market batches and update progress"""
+		market_label = ', '.join(target['info']['name'] for target in targets)
+		for row_num, fields, skip_reason in decoded_rows:
+			self._check_cancelled()
+			self.processed_rows += 1
+			progress = int((self.processed_rows / self.total_all_rows) * 100)
+			
+			# Status is only refreshed per percent (or every 1000 rows); readers are throttled anyway
+			if progress != self.last_percent or row_num % 1000 == 0 or row_num == file_rows:
+				self._update_status(
+					market_label,
+					progress,
+					f"{file_label} ({row_num}/{file_rows} rows, {len(targets)} markets)"
+				)
+			
+			if progress != self.last_percent:
+				self.last_percent = progress
+				bar_length = 40
+				filled_length = int(bar_length * self.processed_rows // self.total_all_rows)
+				bar = '█' * filled_length + '░' * (bar_length - filled_length)
+				sys.stdout.write('\r\x1b[K')
+				sys.stdout.write(f'Overall Progress: [{bar}] {progress}% ({self.processed_rows}/{self.total_all_rows} rows)')
+				sys.stdout.flush()
+
+			for target in targets:
+				market_info = target['info']
+				if skip_reason:
+					product_data = (market_info['settlement'], target['db_market_name']) + fields + (None,)
+					self.skip_sink.add(target['db_market_name'], row_num, product_data, skip_reason)
+					self.skipped_rows += 1
+					continue
+				
+				item_name, item_code, client_price = fields
+				# Updated product data structure without category code
+				target['batch'].append((
+					market_info['settlement'],
+					target['db_market_name'],
+					item_name,
+					item_code,
+					client_price,
+					None  # promotional_price
+				))
+		self.status['rows_decoded'] = self.processed_rows
+
+	def _flush_targets(self, targets: list, file_rows: int, decode_seconds: float):
+		"""Insert the finished market batches of one file and re-apply their saved categories"""
+		self._publish_skip_counts()
+		self._set_stage('insert')
+		previous_stage = self.timer.switch('insert')
+		for target in targets:
+			self.market_count += 1
+			market_started = time.perf_counter()
+			market_name = target['info']['name']
+			current_batch = target['batch']
+			
+			# Insert batch for current market
+			if self.incremental:
+				success = self._apply_market_delta(target['db_market_name'], current_batch)
+			else:
+				logging.info(f"Inserting batch of {len(current_batch)} products from {market_name}...")
+				success = self.db.insert_products_batch(current_batch, table=SHADOW_PRODUCTS_TABLE)
+			if success:
+				self.total_inserted += len(current_batch)
+				logging.info(f"Successfully inserted batch of {len(current_batch)} products from {market_name}.")
+				print(f"  -> Inserted {len(current_batch)} valid rows.")
+				# product_categories is keyed by (market_name, item_code) and never dropped, so the
+				# reloaded rows pick up their categories, including edits made during the run
+			else:
+				error_msg = f"Failed to insert batch of {len(current_batch)} products from {market_name}."
+				logging.error(error_msg)
+				raise Exception(error_msg)
+			
+			sys.stdout.write('\r\x1b[K')
+			logging.info(f"{market_name}: Completed - {file_rows} rows processed ({len(current_batch)} inserted, {file_rows - len(current_batch)} skipped)")
+			print(f"{market_name}: Completed - {file_rows} rows processed ({len(current_batch)} inserted, {file_rows - len(current_batch)} skipped)")
+			self.status['processed_markets'] = self.market_count
+			market_skips = self.skip_sink.counts.get(target['db_market_name'])
+			if market_skips:
+				logging.info(f"{market_name}: skipped rows by reason: {market_skips}")
+			fingerprint = self.source_fingerprints.get(target['info']['path_to_db'])
+			if fingerprint:
+				# Saved only once the run succeeds, so a failed run never marks a file as loaded
+				self.pending_fingerprints.append((target['db_market_name'], target['info']['path_to_db'], fingerprint))
+			# The file is decoded once for all of its markets, so each market is charged the full decode
+			market_seconds = decode_seconds + time.perf_counter() - market_started
+			self.market_metrics[target['db_market_name']] = {
+				'rows': file_rows,
+				'inserted': len(current_batch),
+				'seconds': round(market_seconds, 3),
+				'rows_per_second': round(file_rows / market_seconds, 1) if market_seconds > 0 else 0.0
+			}
+			# Release the batch as soon as it is written
+			target['batch'] = []
+		self.timer.switch(previous_stage)
+
+	def _apply_market_delta(self, db_market_name: str, batch: list) -> bool:
+		"""Diff a decoded market batch against the stored rows and write only what changed"""
+		existing = self.db.get_market_products(db_market_name)
+		# Later duplicates of an item code win, matching INSERT OR REPLACE in full mode
+		incoming = {product[3]: product for product in batch}
+		inserts = []
+		updates = []
+		for item_code, product in incoming.items():
+			stored = existing.get(item_code)
+			if stored is None:
+				inserts.append(product)
+			elif stored != (product[0], product[2], product[4], product[5]):
+				updates.append(product)
+		deletes = [(db_market_name, item_code) for item_code in existing if item_code not in incoming]
+		self.rows_changed += len(inserts) + len(updates) + len(deletes)
+		logging.info(f"{db_market_name}: {len(inserts)} new, {len(updates)} changed, {len(deletes)} removed products")
+		return self.db.apply_products_delta(inserts, updates, deletes)
+
+	def _process_serial(self, source_groups: list):
+		"""Decode the Paradox files one after another in this process"""
+		for file_count, group in enumerate(source_groups, 1):
+			path_to_db = group[0]['path_to_db']
+			group_names = ', '.join(market_info['name'] for market_info in group)
+			file_label = f"File {file_count}/{len(source_groups)}: {path_to_db}"
+			
+			# Update status at the start of each file with current progress
+			current_progress = int((self.processed_rows / self.total_all_rows) * 100)
+			self._update_status(group[0]['name'], current_progress, f"Starting file {file_count}/{len(source_groups)}: {path_to_db} ({len(group)} markets)")
+			logging.info(f"Processing file {file_count}/{len(source_groups)}: {path_to_db} for markets: {group_names}")
+			print(f"\nProcessing file {file_count}/{len(source_groups)}: {path_to_db} ({len(group)} markets)")
+			
 			try:
-				table = Table(market_info['path_to_db'], encoding='windows-1251')
-				total_rows += sum(1 for _ in table)
+				targets = self._new_targets(group)
+				self._set_stage('decode')
+				self.timer.switch('decode')
+				decode_started = time.perf_counter()
+				with self.reader(path_to_db, encoding='windows-1251') as table:
+					# Header record count - avoids a full decode pass just to size the progress bar
+					file_rows = len(table)
+					logging.info(f"Processing {file_rows} rows from {path_to_db}")
+					print(f"Processing {file_rows} rows...")
+					decoded_rows = ((row_num,) + self._decode_row(row) for row_num, row in enumerate(table, 1))
+					self._dispatch_rows(targets, decoded_rows, file_label, file_rows)
+				self._flush_targets(targets, file_rows, time.perf_counter() - decode_started)
+			except ProcessingCancelled:
+				raise
 			except Exception as e:
-				logging.warning(f"Could not count rows for {market_info['name']}: {e}")
-		return total_rows
-
-	def _log_skipped_row(self, market_name: str, row_num: int, product_data: tuple, reason: str):
-		"""Log a skipped row with all its data"""
-		with open(self.log_file, 'a', encoding='utf-8') as f:
-			f.write(f"Market: {market_name}, Row: {row_num}, Reason: {reason}\n")
-			f.write(f"  Settlement: {product_data[0]}\n")
-			f.write(f"  Market Name: {product_data[1]}\n")
-			f.write(f"  Item Name: {product_data[2]}\n")
-			f.write(f"  Item Code: {product_data[3]}\n")
-			f.write(f"  Retail Price: {product_data[4]}\n")
-			f.write("-" * 40 + "\n")
-		logging.warning(f"Skipped row {row_num} in {market_name}: {reason}")
+				error_msg = f"Critical error processing file {path_to_db} ({group_names}): {e}"
+				logging.critical(error_msg)
+				print(f"\n{error_msg}")
+				self.status['error'] = error_msg
+				self.status['message'] = error_msg
+				raise e
+
+	def _process_parallel(self, source_groups: list, row_counts: list):
+		"""
+		Decode and validate the Paradox files in worker processes. Workers stream decoded
+		chunks back over a queue; this process stays the only SQLite writer and the only
+		owner of the progress and skipped-row counters.
+		"""
+		workers = min(self.workers, len(source_groups))
+		logging.info(f"Decoding {len(source_groups)} files with {workers} worker processes")
+		print(f"\nDecoding {len(source_groups)} files with {workers} worker processes")
+		self._update_status("Decode", 0, f"Decoding {len(source_groups)} files with {workers} worker processes")
+		
+		self._set_stage('decode')
+		# Files decode concurrently; each is timed from the start of the pool until it is done
+		self.timer.switch('decode')
+		decode_started = time.perf_counter()
+		targets_by_group = [self._new_targets(group) for group in source_groups]
+		pending = len(source_groups)
+		with multiprocessing.Manager() as manager, ProcessPoolExecutor(max_workers=workers) as pool:
+			results = manager.Queue()
+			futures = [
+				pool.submit(_decode_source, group_index, group[0]['path_to_db'], results, reader=self.reader)
+				for group_index, group in enumerate(source_groups)
+			]
+			try:
+				while pending:
+					self._check_cancelled()
+					try:
+						kind, group_index, payload = results.get(timeout=1)
+					except queue.Empty:
+						# A worker that died without reporting would otherwise block us forever
+						for future in futures:
+							if future.done() and future.exception():
+								raise future.exception()
+						continue
+					
+					path_to_db = source_groups[group_index][0]['path_to_db']
+					file_label = f"File {group_index + 1}/{len(source_groups)}: {path_to_db}"
+					if kind == 'rows':
+						self._set_stage('decode')
+						self._dispatch_rows(targets_by_group[group_index], payload, file_label, row_counts[group_index])
+					elif kind == 'done':
+						pending -= 1
+						self._flush_targets(targets_by_group[group_index], row_counts[group_index], time.perf_counter() - decode_started)
+					else:
+						raise Exception(f"Worker failed decoding {path_to_db}: {payload}")
+			except Exception as e:
+				if not isinstance(e, ProcessingCancelled):
+					error_msg = f"Critical error during parallel processing: {e}"
+					logging.critical(error_msg)
+					print(f"\n{error_msg}")
+					self.status['error'] = error_msg
+					self.status['message'] = error_msg
+				# Workers already decoding finish their file; queued ones never start
+				for future in futures:
+					future.cancel()
+				raise e
 
 	def paradox_to_sqlite(self):
 		"""Convert Paradox database data to SQLite with persistent categories - WITH MANDATORY BACKUP"""
+		self._start_log()
+		self.timer = StageTimer()
+		self.market_metrics = {}
+		self.run_metrics = None
+		self.timer.switch('backup')
 		
 		# MANDATORY FIRST STEP: Create backup
 		backup_path = self._create_backup()
 		if not backup_path:
-			# If backup fails, stop processing immediately
+			# If backup fails, stop processing immediately; raising fails the run and its job
 			error_msg = "Processing stopped: Database backup failed"
-			self.status['error'] = error_msg
-			self.status['message'] = error_msg
 			logging.error("PROCESSING STOPPED: Backup creation failed")
-			return
+			raise Exception(error_msg)
 
 		# Continue with processing only if backup was successful
-		total_rows = 0
-		skipped_rows = 0
-		market_count = 0
+		self.run_started = time.time()
+		self.run_started_at = datetime.now().isoformat(timespec='seconds')
+		self.skip_sink = None
+		self.total_inserted = 0
+		self.skipped_rows = 0
+		self.market_count = 0
+		self.processed_rows = 0
+		self.last_percent = -1
+		self.status['rows_decoded'] = 0
+		
+		self.rows_changed = 0
+		self.pending_fingerprints = []
 		
+		# Markets that share a Paradox file are decoded together
+		source_groups = self._group_markets_by_source()
+		logging.info(f"{len(self.markets)} markets read from {len(source_groups)} distinct Paradox files")
+		
+		self.timer.switch('fingerprint')
+		self._update_status("Fingerprint", 0, "Checking Paradox files for changes...")
+		self.source_fingerprints = self._fingerprint_sources(source_groups)
+		if self.incremental:
+			configured_markets = [f"{market_info['name']} {market_info['address']}" for market_info in self.markets]
+			self.rows_changed += self.db.delete_products_not_in_markets(configured_markets)
+			source_groups = self._select_changed_sources(source_groups)
+			if not source_groups:
+				if self.rows_changed:
+					# Only unconfigured markets were removed
+					self.db.cleanup_orphaned_categories()
+				self._record_run()
+				if self.rows_changed:
+					self.db.bump_generation()
+				success_msg = "No changes detected in the Paradox files - nothing to process"
+				self.status['processed_markets'] = self.market_count
+				self._update_status("Complete", 100, success_msg)
+				self._set_stage('done')
+				logging.info(success_msg)
+				print(success_msg)
+				return
+		
+		self.timer.switch('count')
 		logging.info("Counting total rows across all markets...")
 		print("Counting total rows across all markets...")
-		total_all_rows = self._count_total_rows()
-		logging.info(f"Total rows to process: {total_all_rows}")
-		print(f"Total rows to process: {total_all_rows}")
-		
-		if total_all_rows == 0:
-			self._update_status("Error", 0, "No rows found to process")
-			return
-
-		processed_rows = 0
-		last_percent = -1
+		row_counts = self._count_source_rows(source_groups)
+		self.total_all_rows = sum(row_counts)
+		logging.info(f"Total rows to process: {self.total_all_rows}")
+		print(f"Total rows to process: {self.total_all_rows}")
 		
-		for market_info in self.markets:
-			market_count += 1
-			market_name = market_info['name']
-			
-			# Update status at the start of each market with current progress
-			current_progress = int((processed_rows / total_all_rows) * 100)
-			self._update_status(market_name, current_progress, f"Starting market {market_count}/{len(self.markets)}: {market_name}")
-			logging.info(f"Processing market {market_count}/{len(self.markets)}: {market_name}")
-			print(f"\nProcessing market {market_count}/{len(self.markets)}: {market_name}")
-			
-			try:
-				table = Table(market_info['path_to_db'], encoding='windows-1251')
-				market_rows = sum(1 for _ in table)
-				table = Table(market_info['path_to_db'], encoding='windows-1251')
-				logging.info(f"Processing {market_rows} rows in {market_name}")
-				print(f"Processing {market_rows} rows...")
-				
-				current_batch = []
-				inserted_item_keys = []
-				
-				for row_num, row in enumerate(table, 1):
-					processed_rows += 1
-					progress = int((processed_rows / total_all_rows) * 100)
-					
-					# Update status more frequently for better progress tracking
-					if row_num % 50 == 0 or row_num == market_rows or progress != last_percent:
-						self._update_status(
-							market_name,
-							progress,
-							f"Market {market_count}/{len(self.markets)}: {market_name} ({row_num}/{market_rows} rows)"
-						)
-					
-					if progress != last_percent:
-						last_percent = progress
-						bar_length = 40
-						filled_length = int(bar_length * processed_rows // total_all_rows)
-						bar = '█' * filled_length + '░' * (bar_length - filled_length)
-						sys.stdout.write('\r\x1b[K')
-						sys.stdout.write(f'Overall Progress: [{bar}] {progress}% ({processed_rows}/{total_all_rows} rows)')
-						sys.stdout.flush()
-
-					# Check Act column - skip if not equal to '*'
-					if row.Act != '*':
-						product_data = (
-							market_info['settlement'],
-							f"{market_info['name']} {market_info['address']}",
-							str(row.Item) if hasattr(row, 'Item') and row.Item is not None else None,
-							str(row.id) if hasattr(row, 'id') and row.id is not None else None,
-							float(row.ClientPrice) if hasattr(row, 'ClientPrice') and row.ClientPrice is not None else 0.0,
-							None
-						)
-						self._log_skipped_row(market_name, row_num, product_data, f"Act column not equal to '*' (value: {row.Act})")
-						logging.info(f"Row {row_num} in {market_name} skipped due to Act column value: {row.Act}")
-						skipped_rows += 1
-						continue
-
-					# Pre-validate row attributes
-					missing_attributes = []
-					if not hasattr(row, 'Item') or row.Item is None:
-						missing_attributes.append('Item')
-					if not hasattr(row, 'id') or row.id is None:
-						missing_attributes.append('id')
-					if not hasattr(row, 'ClientPrice') or row.ClientPrice is None:
-						missing_attributes.append('ClientPrice')
-					
-					if missing_attributes:
-						product_data = (
-							market_info['settlement'],
-							f"{market_info['name']} {market_info['address']}",
-							str(row.Item) if hasattr(row, 'Item') and row.Item is not None else None,
-							str(row.id) if hasattr(row, 'id') and row.id is not None else None,
-							float(row.ClientPrice) if hasattr(row, 'ClientPrice') and row.ClientPrice is not None else 0.0,
-							None
-						)
-						self._log_skipped_row(market_name, row_num, product_data, f"Missing attributes: {missing_attributes}")
-						logging.warning(f"Row {row_num} in {market_name} missing attributes: {missing_attributes}. Skipping.")
-						skipped_rows += 1
-						continue
-
-					try:
-						item_name = str(row.Item) if row.Item is not None else ""
-						item_code = str(row.id) if row.id is not None else ""
-						client_price = float(row.ClientPrice) if row.ClientPrice is not None else 0.0
-						db_market_name = f"{market_info['name']} {market_info['address']}"
-						
-						# Updated product data structure without category code
-						product_data = (
-							market_info['settlement'],
-							db_market_name,
-							item_name,
-							item_code,
-							client_price,
-							None  # promotional_price
-						)
-						current_batch.append(product_data)
-						inserted_item_keys.append((db_market_name, item_code))
-					except (ValueError, TypeError) as e:
-						product_data = (
-							market_info['settlement'],
-							f"{market_info['name']} {market_info['address']}",
-							str(row.Item) if hasattr(row, 'Item') else None,
-							str(row.id) if hasattr(row, 'id') else None,
-							float(row.ClientPrice) if hasattr(row, 'ClientPrice') and row.ClientPrice is not None else None,
-							None
-						)
-						self._log_skipped_row(market_name, row_num, product_data, f"Data format error during preparation: {e}")
-						logging.warning(f"Invalid data format at row {row_num} in {market_name} during preparation: {e}. Skipping.")
-						skipped_rows += 1
-						continue
+		if self.total_all_rows == 0:
+			error_msg = "No rows found to process"
+			self._update_status("Error", 0, error_msg)
+			logging.error(error_msg)
+			raise Exception(error_msg)
 
-				# Insert batch for current market
-				logging.info(f"Inserting batch of {len(current_batch)} products from {market_name}...")
-				success = self.db.insert_products_batch(current_batch)
-				if success:
-					total_rows += len(current_batch)
-					logging.info(f"Successfully inserted batch of {len(current_batch)} products from {market_name}.")
-					print(f"  -> Inserted {len(current_batch)} valid rows.")
-					
-					# Apply category assignments after batch insert
-					assignments_to_update = []
-					for item_key in inserted_item_keys:
-						assigned_category = self.category_assignments.get(item_key)
-						if assigned_category:
-							assignments_to_update.append((assigned_category, item_key[0], item_key[1]))
-					
-					if assignments_to_update:
-						logging.info(f"Updating categories for {len(assignments_to_update)} products in {market_name}...")
-						self.db.update_categories_batch(assignments_to_update)
-						logging.info(f"Categories updated for {market_name}.")
+		# The shadow tables fill through a separate connection with relaxed sync and a larger
+		# cache. Incremental runs write the live products table directly with the regular profile.
+		load_profile = self.db.bulk_load() if not self.incremental else contextlib.nullcontext()
+		self.skip_sink = SkippedRowSink(self.skipped_rows_file)
+		try:
+			with load_profile:
+				if not self.incremental:
+					# A full reload is built into shadow tables so searches keep working on the old data
+					self.db.create_shadow_tables()
+				if self.workers > 1 and len(source_groups) > 1:
+					self._process_parallel(source_groups, row_counts)
 				else:
-					error_msg = f"Failed to insert batch of {len(current_batch)} products from {market_name}."
-					logging.error(error_msg)
-					raise Exception(error_msg)
-				
-				sys.stdout.write('\r\x1b[K')
-				logging.info(f"{market_name}: Completed - {market_rows} rows processed ({len(current_batch)} inserted, {market_rows - len(current_batch)} skipped)")
-				print(f"{market_name}: Completed - {market_rows} rows processed ({len(current_batch)} inserted, {market_rows - len(current_batch)} skipped)")
-				self.status['processed_markets'] = market_count
-				
-			except Exception as e:
-				error_msg = f"Critical error processing market {market_name}: {e}"
-				logging.critical(error_msg)
-				print(f"\n{error_msg}")
-				self.status['error'] = error_msg
-				self.status['message'] = error_msg
-				raise e
+					self._process_serial(source_groups)
+			# Last chance to stop: after the swap the run is committed
+			self._check_cancelled()
+		except Exception:
+			if not self.incremental:
+				# Leave the live tables exactly as they were
+				self.db.drop_shadow_tables()
+			else:
+				# Markets written before the failure are already live
+				self.db.bump_generation()
+			raise
+		finally:
+			self.skip_sink.close()
+			self._publish_skip_counts()
+
+		# The swap and cleanup touch live data, so they run with the regular profile again
+		self._set_stage('fts')
+		if not self.incremental:
+			self.timer.switch('swap')
+			self._update_status("Swap", 100, "Indexing and swapping in the reloaded products...")
+			logging.info("Swapping in shadow products tables...")
+			print("\nIndexing and swapping in the reloaded products...")
+			self.db.swap_shadow_tables()
+		self.timer.switch('cleanup')
+		self.db.save_source_fingerprints(self.pending_fingerprints)
 
 		# Clean up orphaned categories after all processing
 		logging.info("Cleaning up orphaned category assignments...")
 		orphaned_count = self.db.cleanup_orphaned_categories()
 		print(f"Cleaned up {orphaned_count} orphaned category assignments.")
-		
-		# Rebuild FTS index
-		logging.info("Rebuilding FTS5 index...")
-		print("\nRebuilding FTS5 index...")
-		self.db.rebuild_fts_index()
+		# New markets and items take over the categories of their market group
+		self.db.inherit_group_categories()
+		# Incremental changes were indexed row by row by the products_fts triggers
+		self._record_run()
+		# Cached search results refer to the previous data
+		self.db.bump_generation()
 		
 		# Final status update
 		sys.stdout.write('\r\x1b[K')
-		success_msg = f"Processing completed successfully! {total_rows} rows inserted, {skipped_rows} rows skipped"
+		success_msg = f"Processing completed successfully! {self.total_inserted} rows inserted, {self.skipped_rows} rows skipped"
+		if self.incremental:
+			success_msg += f" ({self.rows_changed} rows changed)"
 		self._update_status("Complete", 100, success_msg)
-		logging.info(f"Paradox to SQLite conversion completed: {total_rows} rows inserted, {skipped_rows} rows skipped")
-		print(f"\nParadox to SQLite conversion completed: {total_rows} rows inserted, {skipped_rows} rows skipped")
-		print(f"Skipped rows logged to: {self.log_file}")
+		self._set_stage('done')
+		logging.info(f"Paradox to SQLite conversion completed: {self.total_inserted} rows inserted, {self.skipped_rows} rows skipped")
+		logging.info(f"Rows decoded from Paradox this run: {self.processed_rows} (header total: {self.total_all_rows})")
+		print(f"\nParadox to SQLite conversion completed: {self.total_inserted} rows inserted, {self.skipped_rows} rows skipped")
+		print(f"Rows decoded from Paradox this run: {self.processed_rows}")
+		print(f"Skipped rows logged to: {self.skipped_rows_file}")
+
+def market_category_groups(markets: list, share_source: bool = True) -> dict:
+	"""
+	Group markets that share category assignments: markets reading the same Paradox file (if
+	share_source) and markets with the same category_group in config.yaml, merged transitively.
+	Returns {market_name: group_id} for markets with at least one partner.
+	"""
+	parents = {}
+	def find(key):
+		while parents.setdefault(key, key) != key:
+			key = parents[key]
+		return key
+
+	for market_info in markets:
+		market_name = f"{market_info['name']} {market_info['address']}"
+		links = []
+		if share_source:
+			links.append('source:' + os.path.normcase(os.path.abspath(market_info['path_to_db'])))
+		if market_info.get('category_group'):
+			links.append(f"group:{market_info['category_group']}")
+		for link in links:
+			parents[find(link)] = find(market_name)
+
+	groups = {}
+	for market_info in markets:
+		market_name = f"{market_info['name']} {market_info['address']}"
+		groups.setdefault(find(market_name), []).append(market_name)
+	return {
+		market_name: group_id
+		for group_id, market_names in groups.items() if len(market_names) > 1
+		for market_name in market_names
+	}
+
+def _decode_source(group_index: int, path_to_db: str, results, chunk_size: int = 1000, reader=Table):
+	"""
+	Worker entry point for parallel ingestion. Decodes and validates one Paradox file and
+	streams ('rows', group_index, [(row_num, fields, skip_reason), ...]) chunks back to the
+	writer, followed by ('done', group_index, None) or ('error', group_index, message).
+	"""
+	try:
+		with reader(path_to_db, encoding='windows-1251') as table:
+			chunk = []
+			for row_num, row in enumerate(table, 1):
+				chunk.append((row_num,) + DataProcessor._decode_row(row))
+				if len(chunk) >= chunk_size:
+					results.put(('rows', group_index, chunk))
+					chunk = []
+			if chunk:
+				results.put(('rows', group_index, chunk))
+		results.put(('done', group_index, None))
+	except Exception as e:
+		results.put(('error', group_index, str(e)))
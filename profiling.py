@@ -0,0 +1,83 @@
+import os
+import io
+import pstats
+import logging
+import cProfile
+import tracemalloc
+from datetime import datetime
+
+class RunProfiler:
+	"""
+	Runs an ingestion under cProfile and tracemalloc. Writes run.prof (for pstats or
+	snakeviz), functions.txt and allocations.txt into a timestamped directory under
+	output_dir, and keeps a short summary for the processing status. Only the calling
+	thread is profiled, so with workers > 1 the decoding in worker processes is not included.
+	"""
+	def __init__(self, output_dir: str = './profiles', top_n: int = 25):
+		self.output_dir = output_dir
+		self.top_n = int(top_n)
+		self.directory = None
+		self.summary = None
+
+	def run(self, func, *args, **kwargs):
+		"""Call func under the profilers; the reports are written even if it raises"""
+		self.directory = os.path.join(self.output_dir, datetime.now().strftime('%Y%m%d_%H%M%S'))
+		os.makedirs(self.directory, exist_ok=True)
+		already_tracing = tracemalloc.is_tracing()
+		if not already_tracing:
+			tracemalloc.start()
+		tracemalloc.reset_peak()
+		profile = cProfile.Profile()
+		profile.enable()
+		try:
+			return func(*args, **kwargs)
+		finally:
+			profile.disable()
+			snapshot = tracemalloc.take_snapshot()
+			_, peak_bytes = tracemalloc.get_traced_memory()
+			if not already_tracing:
+				tracemalloc.stop()
+			try:
+				self.summary = self._write_reports(profile, snapshot, peak_bytes)
+				logging.info(f"Profile of the processing run written to {self.directory}")
+			except OSError as e:
+				logging.error(f"Error writing profile reports: {e}")
+
+	def _write_reports(self, profile, snapshot, peak_bytes: int) -> dict:
+		profile.dump_stats(os.path.join(self.directory, 'run.prof'))
+
+		text = io.StringIO()
+		stats = pstats.Stats(profile, stream=text)
+		stats.sort_stats('cumulative').print_stats(self.top_n)
+		stats.sort_stats('tottime').print_stats(self.top_n)
+		with open(os.path.join(self.directory, 'functions.txt'), 'w', encoding='utf-8') as f:
+			f.write(text.getvalue())
+
+		# Ignore the profilers' own bookkeeping
+		snapshot = snapshot.filter_traces((
+			tracemalloc.Filter(False, tracemalloc.__file__),
+			tracemalloc.Filter(False, cProfile.__file__)
+		))
+		allocations = snapshot.statistics('lineno')[:self.top_n]
+		with open(os.path.join(self.directory, 'allocations.txt'), 'w', encoding='utf-8') as f:
+			f.write(f"Peak traced memory: {peak_bytes / 1024 / 1024:.1f} MiB\n")
+			f.write(f"Top {self.top_n} allocation sites still held at the end of the run:\n")
+			for statistic in allocations:
+				f.write(f"{statistic}\n")
+
+		# Hottest functions by own time, for the status
+		hot_functions = []
+		for (file_name, line, function), (_, calls, own_time, cumulative_time, _) in sorted(
+				stats.stats.items(), key=lambda item: item[1][2], reverse=True)[:10]:
+			hot_functions.append({
+				'function': f"{os.path.basename(file_name)}:{line}({function})",
+				'calls': calls,
+				'own_seconds': round(own_time, 3),
+				'cumulative_seconds': round(cumulative_time, 3)
+			})
+		return {
+			'directory': self.directory,
+			'total_seconds': round(stats.total_tt, 3),
+			'peak_memory_bytes': peak_bytes,
+			'hot_functions': hot_functions
+		}
@@ -0,0 +1,121 @@
+import os
+import time
+import logging
+import threading
+from datetime import datetime, timedelta
+
+class ProcessingScheduler:
+	"""
+	Starts ingestion runs inside the server process: every day at scheduled_time (skipped
+	when no Paradox file changed since the last run) and, in watch mode, whenever a
+	path_to_db file was modified and has then stayed unchanged for debounce_seconds.
+	"""
+	def __init__(self, markets: list, start_run, sources_changed, scheduled_time: str = None,
+			watch: bool = False, debounce_seconds: float = 30, poll_seconds: float = 5):
+		"""
+		:param start_run: Callable(reason) starting a run in the background; returns False if one is already running.
+		:param sources_changed: Callable() returning whether any Paradox file changed since it was last loaded.
+		"""
+		self.start_run = start_run
+		self.sources_changed = sources_changed
+		self.scheduled_time = self._parse_time(scheduled_time) if scheduled_time else None
+		self.watch = watch
+		self.debounce_seconds = float(debounce_seconds)
+		self.poll_seconds = float(poll_seconds)
+		self.watch_paths = sorted(set(self._source_paths(markets)))
+		self._stop = threading.Event()
+		self._threads = []
+
+	@staticmethod
+	def _parse_time(value) -> tuple:
+		if isinstance(value, int):
+			# YAML 1.1 reads an unquoted 03:00 as sexagesimal minutes
+			return divmod(value, 60)
+		hour, minute = str(value).split(':')
+		return int(hour), int(minute)
+
+	@staticmethod
+	def _source_paths(markets: list) -> list:
+		"""Every path_to_db plus its .MB blob file, if any"""
+		paths = []
+		for market_info in markets:
+			path_to_db = market_info['path_to_db']
+			paths.append(path_to_db)
+			blob_path = path_to_db.replace('.db', '.mb').replace('.DB', '.MB')
+			if blob_path != path_to_db:
+				paths.append(blob_path)
+		return paths
+
+	def start(self):
+		if self.scheduled_time:
+			self._start_thread(self._run_schedule, 'processing-schedule')
+			logging.info(f"Scheduled processing at {self.scheduled_time[0]:02d}:{self.scheduled_time[1]:02d} every day")
+		if self.watch:
+			self._start_thread(self._run_watch, 'processing-watch')
+			logging.info(f"Watching {len(self.watch_paths)} Paradox files for changes")
+
+	def stop(self):
+		self._stop.set()
+
+	def _start_thread(self, target, name: str):
+		thread = threading.Thread(target=target, name=name)
+		thread.daemon = True
+		thread.start()
+		self._threads.append(thread)
+
+	def next_run_time(self, now: datetime = None) -> datetime:
+		now = now or datetime.now()
+		hour, minute = self.scheduled_time
+		next_run = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+		if next_run <= now:
+			next_run += timedelta(days=1)
+		return next_run
+
+	def _run_schedule(self):
+		while not self._stop.is_set():
+			next_run = self.next_run_time()
+			# Sleep in short steps so clock changes (DST, suspend) are picked up
+			while not self._stop.is_set() and datetime.now() < next_run:
+				self._stop.wait(min(60, max(0.0, (next_run - datetime.now()).total_seconds())))
+			if self._stop.is_set():
+				return
+			try:
+				if not self.sources_changed():
+					logging.info("Scheduled processing skipped: no Paradox file changed since the last run")
+				elif not self.start_run('scheduled'):
+					logging.info("Scheduled processing skipped: processing is already running")
+			except Exception as e:
+				logging.error(f"Scheduled processing failed to start: {e}")
+
+	def _snapshot(self) -> dict:
+		snapshot = {}
+		for path in self.watch_paths:
+			try:
+				stat = os.stat(path)
+				snapshot[path] = (stat.st_size, stat.st_mtime_ns)
+			except OSError:
+				snapshot[path] = None
+		return snapshot
+
+	def _run_watch(self):
+		baseline = self._snapshot()
+		last_seen = baseline
+		last_change = None
+		while not self._stop.wait(self.poll_seconds):
+			current = self._snapshot()
+			if current != last_seen:
+				# Still being written; restart the quiet period
+				last_seen = current
+				last_change = time.monotonic()
+				continue
+			if current == baseline or last_change is None:
+				continue
+			if time.monotonic() - last_change < self.debounce_seconds:
+				continue
+			try:
+				if self.start_run('watch'):
+					logging.info("Paradox files changed - processing started")
+					baseline = current
+					last_change = None
+			except Exception as e:
+				logging.error(f"Watch-triggered processing failed to start: {e}")
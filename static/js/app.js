@@ -2,7 +2,16 @@ let currentProducts = [];
 let currentSearchTerm = '';
 let currentCategoryCode = '';
 let isProcessingActive = false;
-let statusCheckInterval = null;
+let processingEvents = null;
+
+// Paging state - products are loaded PAGE_SIZE rows at a time
+const PAGE_SIZE = 200;
+let currentNextCursor = null;
+let currentTotal = null;
+let isLoadingPage = false;
+let currentViewId = 0;
+// Set by "select all": every result of the view is selected, including pages not loaded yet
+let allResultsSelected = false;
 
 // Sorting state
 let currentSort = {
@@ -10,80 +19,99 @@ let currentSort = {
 	direction: 'asc' // 'asc' or 'desc'
 };
 
-// Check processing status periodically
+// Apply a processing status snapshot to the loading screen, banner and buttons
+function applyProcessingStatus(data) {
+	// Update loading screen with the exact progress from backend
+	document.getElementById('loadingProgress').style.width = data.progress + '%';
+	document.getElementById('progressPercent').textContent = data.progress;
+	document.getElementById('currentMarket').textContent = data.current_market || '-';
+	document.getElementById('loadingMessage').textContent = data.message;
+
+	// Handle errors
+	if (data.error) {
+		document.getElementById('loadingTitle').textContent = 'Грешка при обработка';
+		document.getElementById('errorText').textContent = data.error;
+		document.getElementById('errorMessage').style.display = 'block';
+		document.getElementById('loadingScreen').style.display = 'flex';
+		isProcessingActive = false;
+		// Re-enable processing button on error
+		document.getElementById('startProcessingBtn').disabled = false;
+		document.getElementById('startProcessingBtn').innerHTML = '<i class="bi bi-play-fill"></i> Обработка на данни';
+		return;
+	}
+
+	// Show/hide loading screen based on processing status
+	if (data.is_processing) {
+		isProcessingActive = true;
+		if (data.database_ready) {
+			// The reload is built in the background - keep the existing data usable
+			document.getElementById('loadingScreen').style.display = 'none';
+			document.getElementById('mainContent').style.display = 'flex';
+			document.getElementById('processingBanner').style.display = 'block';
+			document.getElementById('bannerProgress').textContent = data.progress;
+			document.getElementById('bannerMessage').textContent = data.message;
+		} else {
+			document.getElementById('loadingScreen').style.display = 'flex';
+			document.getElementById('mainContent').style.display = 'none';
+		}
+	} else {
+		isProcessingActive = false;
+		document.getElementById('processingBanner').style.display = 'none';
+		document.getElementById('loadingScreen').style.display = 'none';
+		document.getElementById('mainContent').style.display = 'flex';
+		// Re-enable processing button when processing is complete
+		document.getElementById('startProcessingBtn').disabled = false;
+		document.getElementById('startProcessingBtn').innerHTML = '<i class="bi bi-play-fill"></i> Обработка на данни';
+		
+		// If database is ready, enable export
+		if (data.database_ready) {
+			document.getElementById('exportCsv').disabled = false;
+			// Only show search prompt if we don't have current search results AND no category is selected
+			if (currentSearchTerm === '' && currentCategoryCode === '') {
+				showSearchPrompt();
+			}
+		} else {
+			document.getElementById('exportCsv').disabled = true;
+		}
+	}
+}
+
+// Fetch the current processing status once and follow it live while processing runs
 function checkProcessingStatus() {
 	fetch('/api/processing-status')
 		.then(response => response.json())
 		.then(data => {
-			// Update loading screen with the exact progress from backend
-			document.getElementById('loadingProgress').style.width = data.progress + '%';
-			document.getElementById('progressPercent').textContent = data.progress;
-			document.getElementById('currentMarket').textContent = data.current_market || '-';
-			document.getElementById('loadingMessage').textContent = data.message;
-
-			// Handle errors
-			if (data.error) {
-				document.getElementById('loadingTitle').textContent = 'Грешка при обработка';
-				document.getElementById('errorText').textContent = data.error;
-				document.getElementById('errorMessage').style.display = 'block';
-				document.getElementById('loadingScreen').style.display = 'flex';
-				isProcessingActive = false;
-				// Re-enable processing button on error
-				document.getElementById('startProcessingBtn').disabled = false;
-				document.getElementById('startProcessingBtn').innerHTML = '<i class="bi bi-play-fill"></i> Обработка на данни';
-				return;
-			}
-
-			// Show/hide loading screen based on processing status
+			applyProcessingStatus(data);
 			if (data.is_processing) {
-				isProcessingActive = true;
-				document.getElementById('loadingScreen').style.display = 'flex';
-				document.getElementById('mainContent').style.display = 'none';
-				// Continue checking status every 2 seconds during processing
-				if (statusCheckInterval) {
-					clearInterval(statusCheckInterval);
-				}
-				statusCheckInterval = setInterval(checkProcessingStatus, 2000);
-			} else {
-				isProcessingActive = false;
-				document.getElementById('loadingScreen').style.display = 'none';
-				document.getElementById('mainContent').style.display = 'flex';
-				// Re-enable processing button when processing is complete
-				document.getElementById('startProcessingBtn').disabled = false;
-				document.getElementById('startProcessingBtn').innerHTML = '<i class="bi bi-play-fill"></i> Обработка на данни';
-				
-				// If database is ready, enable export and stop checking
-				if (data.database_ready) {
-					document.getElementById('exportCsv').disabled = false;
-					// Stop checking status after processing is complete
-					if (statusCheckInterval) {
-						clearInterval(statusCheckInterval);
-						statusCheckInterval = null;
-					}
-					// Only show search prompt if we don't have current search results AND no category is selected
-					if (currentSearchTerm === '' && currentCategoryCode === '') {
-						showSearchPrompt();
-					}
-				} else {
-					document.getElementById('exportCsv').disabled = true;
-					// Check status every 10 seconds when not processing but database not ready
-					if (statusCheckInterval) {
-						clearInterval(statusCheckInterval);
-					}
-					statusCheckInterval = setInterval(checkProcessingStatus, 10000);
-				}
+				subscribeProcessingEvents();
 			}
 		})
 		.catch(error => {
 			console.error('Error checking status:', error);
-			// Continue checking even on error, but less frequently (every 30 seconds)
-			if (statusCheckInterval) {
-				clearInterval(statusCheckInterval);
-			}
-			statusCheckInterval = setInterval(checkProcessingStatus, 30000);
 		});
 }
 
+// Subscribe to server-sent processing events; the server closes the stream when processing ends
+function subscribeProcessingEvents() {
+	if (processingEvents) {
+		return;
+	}
+	processingEvents = new EventSource('/api/processing-events');
+	processingEvents.addEventListener('status', function(e) {
+		applyProcessingStatus(JSON.parse(e.data));
+	});
+	processingEvents.addEventListener('done', function() {
+		processingEvents.close();
+		processingEvents = null;
+	});
+	processingEvents.onerror = function() {
+		// Connection lost mid-run - fall back to a single status check a little later
+		processingEvents.close();
+		processingEvents = null;
+		setTimeout(checkProcessingStatus, 5000);
+	};
+}
+
 // Start manual processing
 function startManualProcessing() {
 	// Disable the button to prevent multiple clicks
@@ -133,63 +161,137 @@ function showSearchPrompt() {
 		tbody.innerHTML = '';
 		noResults.style.display = 'none';
 		searchPrompt.style.display = 'block';
+		// Drop any paged view so stale pages are not appended
+		currentViewId++;
+		allResultsSelected = false;
+		currentProducts = [];
+		currentNextCursor = null;
+		updatePageInfo();
 	}
 }
 
-// Load products from the server
-function loadProducts(searchTerm = '') {
-	currentSearchTerm = searchTerm;
-	currentCategoryCode = '';
+// Build the products API URL for the current search or category view
+function buildProductsUrl(cursor) {
+	const params = new URLSearchParams({ limit: PAGE_SIZE });
 	let url = '/api/search';
-	if (searchTerm) {
-		url += '?q=' + encodeURIComponent(searchTerm);
+	if (currentCategoryCode) {
+		url = '/api/products-by-category';
+		params.set('category_code', currentCategoryCode);
+	} else {
+		params.set('q', currentSearchTerm);
 	}
-	fetch(url)
+	if (cursor) {
+		params.set('cursor', cursor);
+	} else {
+		// The total is only needed once per view
+		params.set('count', '1');
+	}
+	return url + '?' + params.toString();
+}
+
+// Show how many products are loaded and whether more pages are available
+function updatePageInfo() {
+	const pageInfo = document.getElementById('pageInfo');
+	if (currentProducts.length && currentTotal !== null && currentTotal !== undefined) {
+		pageInfo.textContent = `Показани ${currentProducts.length} от ${currentTotal} продукта`;
+	} else {
+		pageInfo.textContent = '';
+	}
+	document.getElementById('loadMore').style.display = currentNextCursor ? 'block' : 'none';
+}
+
+// Load the first page of the current view
+function loadFirstPage(onLoaded) {
+	const viewId = ++currentViewId;
+	allResultsSelected = false;
+	currentNextCursor = null;
+	currentTotal = null;
+	fetch(buildProductsUrl(null))
 		.then(response => response.json())
 		.then(data => {
+			if (viewId !== currentViewId) {
+				return;
+			}
 			if (data.error) {
 				console.error('Error loading products:', data.error);
 				return;
 			}
 			currentProducts = data.products || [];
+			currentNextCursor = data.next_cursor;
+			currentTotal = data.total;
 			// Reset sorting when loading new data
 			resetSorting();
-			displayProducts(currentProducts, data.search_term);
+			onLoaded(data);
+			updatePageInfo();
 		})
 		.catch(error => {
 			console.error('Error loading products:', error);
 		});
 }
 
-// Load products by category
-function loadProductsByCategory(categoryCode) {
-	if (!categoryCode) {
-		currentCategoryCode = '';
-		showSearchPrompt();
+// Append the next page of the current view, keeping the sort order and selection
+function loadNextPage() {
+	if (!currentNextCursor || isLoadingPage) {
 		return;
 	}
-	currentCategoryCode = categoryCode;
-	let url = '/api/products-by-category?category_code=' + encodeURIComponent(categoryCode);
-	fetch(url)
+	const viewId = currentViewId;
+	isLoadingPage = true;
+	fetch(buildProductsUrl(currentNextCursor))
 		.then(response => response.json())
 		.then(data => {
+			if (viewId !== currentViewId) {
+				return;
+			}
 			if (data.error) {
-				console.error('Error loading products by category:', data.error);
+				console.error('Error loading next page:', data.error);
 				return;
 			}
-			currentProducts = data.products || [];
-			// Reset sorting when loading new data
-			resetSorting();
-			displayProducts(currentProducts, '');
-			// Clear the search input when loading by category
-			document.getElementById('searchInput').value = '';
-			currentSearchTerm = '';
+			const selectedIds = new Set(Array.from(document.querySelectorAll('.item-checkbox:checked')).map(cb => cb.value));
+			const loadedIds = new Set(Array.from(document.querySelectorAll('.item-checkbox')).map(cb => cb.value));
+			currentProducts = currentProducts.concat(data.products || []);
+			currentNextCursor = data.next_cursor;
+			const products = currentSort.column ? sortProducts(currentSort.column, currentSort.direction) : currentProducts;
+			displayProducts(products, currentSearchTerm);
+			document.querySelectorAll('.item-checkbox').forEach(checkbox => {
+				// New rows join a select-all selection; rows unchecked before stay excluded
+				checkbox.checked = selectedIds.has(checkbox.value) || (allResultsSelected && !loadedIds.has(checkbox.value));
+			});
+			updateSelectedCount();
+			updatePageInfo();
 		})
 		.catch(error => {
-			console.error('Error loading products by category:', error);
+			console.error('Error loading next page:', error);
+		})
+		.finally(() => {
+			isLoadingPage = false;
 		});
 }
 
+// Load products from the server
+function loadProducts(searchTerm = '') {
+	currentSearchTerm = searchTerm;
+	currentCategoryCode = '';
+	loadFirstPage(data => {
+		displayProducts(currentProducts, data.search_term);
+	});
+}
+
+// Load products by category
+function loadProductsByCategory(categoryCode) {
+	if (!categoryCode) {
+		currentCategoryCode = '';
+		showSearchPrompt();
+		return;
+	}
+	currentCategoryCode = categoryCode;
+	// Clear the search input when loading by category
+	document.getElementById('searchInput').value = '';
+	currentSearchTerm = '';
+	loadFirstPage(data => {
+		displayProducts(currentProducts, '');
+	});
+}
+
 // Sorting functions
 function sortProducts(column, direction) {
 	if (!currentProducts.length) return;
@@ -317,13 +419,32 @@ function displayProducts(products, searchTerm) {
 	updateSelectedCount();
 }
 
+// Whether the selection covers pages that are not loaded and must be resolved server-side
+function selectionCoversUnloadedPages() {
+	return allResultsSelected && currentNextCursor !== null && currentNextCursor !== undefined;
+}
+
+// Request body describing the selected products: explicit ids, or the whole view minus unchecked rows
+function buildSelectionPayload() {
+	if (selectionCoversUnloadedPages()) {
+		const excludedIds = Array.from(document.querySelectorAll('.item-checkbox:not(:checked)')).map(cb => cb.value);
+		const selection = currentCategoryCode ? { category_code: currentCategoryCode } : { search: currentSearchTerm };
+		return { selection: selection, exclude_ids: excludedIds };
+	}
+	return { product_ids: Array.from(document.querySelectorAll('.item-checkbox:checked')).map(cb => cb.value) };
+}
+
 // Update selected count function
 function updateSelectedCount() {
 	const selectedCheckboxes = document.querySelectorAll('.item-checkbox:checked');
-	document.getElementById('selectedCount').textContent = selectedCheckboxes.length;
+	const totalCheckboxes = document.querySelectorAll('.item-checkbox');
+	let selectedCount = selectedCheckboxes.length;
+	if (selectionCoversUnloadedPages() && currentTotal !== null && currentTotal !== undefined) {
+		selectedCount = currentTotal - (totalCheckboxes.length - selectedCheckboxes.length);
+	}
+	document.getElementById('selectedCount').textContent = selectedCount;
 	
 	// Update select all checkbox state
-	const totalCheckboxes = document.querySelectorAll('.item-checkbox');
 	document.getElementById('selectAll').checked = selectedCheckboxes.length > 0 && selectedCheckboxes.length === totalCheckboxes.length;
 }
 
@@ -361,6 +482,14 @@ function initializeApplication() {
 	// Clear search button
 	document.getElementById('clearSearchButton').addEventListener('click', clearSearch);
 
+	// Load further pages on demand
+	document.getElementById('loadMoreButton').addEventListener('click', loadNextPage);
+	document.querySelector('.table-container').addEventListener('scroll', function() {
+		if (this.scrollTop + this.clientHeight >= this.scrollHeight - 200) {
+			loadNextPage();
+		}
+	});
+
 	// Use event delegation for checkbox changes
 	document.getElementById('productsTableBody').addEventListener('change', function(e) {
 		if (e.target && e.target.classList.contains('item-checkbox')) {
@@ -370,6 +499,7 @@ function initializeApplication() {
 
 	// Select all functionality
 	document.getElementById('selectAll').addEventListener('change', function() {
+		allResultsSelected = this.checked;
 		const checkboxes = document.querySelectorAll('.item-checkbox');
 		checkboxes.forEach(checkbox => {
 			checkbox.checked = this.checked;
@@ -379,6 +509,7 @@ function initializeApplication() {
 
 	// Clear selection button
 	document.getElementById('clearSelection').addEventListener('click', function() {
+		allResultsSelected = false;
 		document.getElementById('selectAll').checked = false;
 		const checkboxes = document.querySelectorAll('.item-checkbox');
 		checkboxes.forEach(checkbox => {
@@ -396,23 +527,21 @@ function initializeApplication() {
 		}
 
 		const selectedCheckboxes = document.querySelectorAll('.item-checkbox:checked');
-		const selectedProductIds = Array.from(selectedCheckboxes).map(cb => cb.value);
+		const payload = buildSelectionPayload();
 
-		if (selectedProductIds.length === 0) {
+		if (payload.product_ids && payload.product_ids.length === 0) {
 			alert('Моля, изберете поне един продукт преди да го добавите към категория.');
 			return;
 		}
 
 		// Send request to update categories
+		payload.category_code = selectedCategory;
 		fetch('/api/update-category', {
 			method: 'POST',
 			headers: {
 				'Content-Type': 'application/json',
 			},
-			body: JSON.stringify({
-				product_ids: selectedProductIds,
-				category_code: selectedCategory
-			})
+			body: JSON.stringify(payload)
 		})
 		.then(response => response.json())
 		.then(data => {
@@ -443,9 +572,9 @@ function initializeApplication() {
 	// Remove from category button
 	document.getElementById('removeFromCategory').addEventListener('click', function() {
 		const selectedCheckboxes = document.querySelectorAll('.item-checkbox:checked');
-		const selectedProductIds = Array.from(selectedCheckboxes).map(cb => cb.value);
+		const payload = buildSelectionPayload();
 
-		if (selectedProductIds.length === 0) {
+		if (payload.product_ids && payload.product_ids.length === 0) {
 			alert('Моля, изберете поне един продукт преди да го премахнете от категория.');
 			return;
 		}
@@ -456,9 +585,7 @@ function initializeApplication() {
 			headers: {
 				'Content-Type': 'application/json',
 			},
-			body: JSON.stringify({
-				product_ids: selectedProductIds
-			})
+			body: JSON.stringify(payload)
 		})
 		.then(response => response.json())
 		.then(data => {
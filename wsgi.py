@@ -0,0 +1,12 @@
+"""
+WSGI entry point for serving the app with flask run or a WSGI server instead of python app.py:
+
+	flask --app wsgi run --host 0.0.0.0 --port 5000
+	waitress-serve --port=5000 wsgi:app
+
+Use a single worker process: ingestion jobs, the scheduler and the result cache live in the
+server process.
+"""
+from app import app, init_app
+
+init_app()